@@ -9,8 +9,7 @@ import re
 import threading
 from pathlib import Path
 from PIL import Image, ImageTk
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # Import custom utilities
 from utils import (
@@ -18,11 +17,50 @@ from utils import (
     PromptManager,
     OpenRouterClient,
     JinaClient,
-    SitemapParser
+    SitemapParser,
+    SitemapCache,
+    PageCache,
+    ResponseCache,
+    RateLimiter
+)
+from utils.sitemap_cache import write_url_delta
+from utils.url_filter import url_key
+from utils.bounded_executor import iter_bounded
+from utils.boilerplate import BoilerplateStripper
+from utils.text_cleaning import iter_cleaned
+from utils.token_estimator import estimate_tokens, pack_by_budget
+from utils.batch_extraction import build_batch_message, parse_batch_response
+from utils.extraction_aggregator import ExtractionAggregator, navigation_tokens, split_oversized
+from utils.navigation_merge import merge_branches, tree_reduce
+from utils.json_stream import JsonStreamError, JsonStreamParser, PartialResultWriter
+from utils.json_repair import TolerantJsonParser
+from utils.structured_extraction import extract_structured
+from utils.corpus import (
+    CORPUS_GZ,
+    CorpusWriter,
+    compact_corpus,
+    content_fingerprint,
+    convert_corpus,
+    count_corpus,
+    index_path,
+    is_compressed,
+    is_success,
+    iter_corpus,
+    load_completed_urls,
+    resolve_corpus_path
 )
 from utils.custom_widgets import ScrollableFrame, create_modern_checkbox_style
 
 
+# Limit tokenów odpowiedzi dla paczek kroku 4 (rezerwowany w budżecie kontekstu)
+STEP4_MAX_TOKENS = 4000
+
+# Limit tokenów odpowiedzi ekstrakcji jednego produktu w kroku 3 - ze schematem
+# JSON model nie dodaje komentarzy ani bloków markdown, więc wystarcza mniej
+STEP3_MAX_TOKENS = 4000
+STEP3_STRUCTURED_MAX_TOKENS = 2000
+
+
 class DarkInputDialog(tk.Toplevel):
     """Custom input dialog z ciemnym motywem"""
 
@@ -128,16 +166,51 @@ class NexusNavigationApp:
         self.current_project_path = tk.StringVar(value="")
         self.sitemap_url = tk.StringVar()
         self.url_filter_pattern = tk.StringVar(value=".html")
+        self.use_sitemap_cache = tk.BooleanVar(value=True)
+
+        # Variables - API Limits
+        self.jina_requests_per_second = tk.IntVar(value=0)
+        self.openrouter_requests_per_second = tk.IntVar(value=0)
+        self.adaptive_concurrency = tk.BooleanVar(value=False)
+        self.max_concurrency = tk.IntVar(value=50)
+
+        # Variables - LLM Response Cache
+        self.use_response_cache = tk.BooleanVar(value=True)
+        self.response_cache_max_mb = tk.IntVar(value=512)
+        self.stream_responses = tk.BooleanVar(value=True)
+        self.use_structured_output = tk.BooleanVar(value=True)
+        self.response_cache = None
+        self.json_parser = TolerantJsonParser()
 
         # Variables - Step Settings
+        self.num_threads_sitemap = tk.IntVar(value=4)
         self.num_threads_jina = tk.IntVar(value=10)
         self.max_retries_jina = tk.IntVar(value=3)
+        self.jina_engine = tk.StringVar(value="Wątki")
+        self.async_concurrency_jina = tk.IntVar(value=200)
+        self.resume_step2 = tk.BooleanVar(value=True)
+        self.use_page_cache = tk.BooleanVar(value=True)
+        self.page_cache_ttl_days = tk.IntVar(value=30)
+        self.page_cache_max_mb = tk.IntVar(value=2048)
+        self.strip_boilerplate = tk.BooleanVar(value=True)
+        self.max_content_length = tk.IntVar(value=0)
         self.num_threads_extract = tk.IntVar(value=1)
+        self.num_processes_clean = tk.IntVar(value=0)
+        self.incremental_step3 = tk.BooleanVar(value=True)
+        self.structured_step3 = tk.BooleanVar(value=True)
+        self.extract_batch_size = tk.IntVar(value=1)
+        self.extract_token_budget = tk.IntVar(value=12000)
         self.max_retries_extract = tk.IntVar(value=4)
         self.batch_size = tk.IntVar(value=100)
+        self.batch_token_budget = tk.IntVar(value=0)
+        self.aggregate_step4 = tk.BooleanVar(value=True)
+        self.reconcile_step4 = tk.BooleanVar(value=False)
         self.num_threads_batch = tk.IntVar(value=10)
         self.max_retries_batch = tk.IntVar(value=3)
         self.max_retries_final = tk.IntVar(value=3)
+        self.shard_step5 = tk.BooleanVar(value=False)
+        self.num_threads_final = tk.IntVar(value=5)
+        self.reconcile_step5 = tk.BooleanVar(value=True)
 
         # Variables - Model Selection
         self.model_step3 = tk.StringVar()
@@ -390,6 +463,40 @@ class NexusNavigationApp:
 
         api_frame.columnconfigure(1, weight=1)
 
+        # API Limits Section
+        limits_frame = ttk.LabelFrame(content, text="Limity API", padding="15", style='Dark.TLabelframe')
+        limits_frame.pack(fill="x", pady=(0, 15))
+
+        ttk.Label(limits_frame, text="Jina - zapytania/s:", style='Dark.TLabel').grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(limits_frame, from_=0, to=500, textvariable=self.jina_requests_per_second, width=10, style='Dark.TSpinbox').grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Label(limits_frame, text="OpenRouter - zapytania/s:", style='Dark.TLabel').grid(row=0, column=2, sticky=tk.W, padx=(20, 5), pady=5)
+        ttk.Spinbox(limits_frame, from_=0, to=500, textvariable=self.openrouter_requests_per_second, width=10, style='Dark.TSpinbox').grid(row=0, column=3, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Checkbutton(limits_frame, text="Adaptacyjna współbieżność (AIMD)", variable=self.adaptive_concurrency, style='Dark.TCheckbutton').grid(row=1, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+
+        ttk.Label(limits_frame, text="Maks. współbieżność:", style='Dark.TLabel').grid(row=1, column=2, sticky=tk.W, padx=(20, 5), pady=5)
+        ttk.Spinbox(limits_frame, from_=1, to=1000, textvariable=self.max_concurrency, width=10, style='Dark.TSpinbox').grid(row=1, column=3, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Label(limits_frame, text="ℹ️ 0 = bez limitu. Przy 429 zapytania są wstrzymywane zgodnie z Retry-After i ponawiane z wykładniczym backoffem. "
+                                     "W trybie AIMD liczba wątków jest punktem startowym, a współbieżność rośnie do limitu dostawcy.",
+                  style='Dark.TLabel', foreground='#6b7280', wraplength=900).grid(row=2, column=0, columnspan=4, sticky=tk.W, padx=5, pady=(5, 0))
+
+        # LLM Response Cache Section
+        cache_frame = ttk.LabelFrame(content, text="Odpowiedzi AI", padding="15", style='Dark.TLabelframe')
+        cache_frame.pack(fill="x", pady=(0, 15))
+
+        ttk.Checkbutton(cache_frame, text="Zapisuj odpowiedzi AI (kroki 3-5)", variable=self.use_response_cache, style='Dark.TCheckbutton').grid(row=0, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+
+        ttk.Label(cache_frame, text="Maks. rozmiar (MB):", style='Dark.TLabel').grid(row=0, column=2, sticky=tk.W, padx=(20, 5), pady=5)
+        ttk.Spinbox(cache_frame, from_=16, to=100000, textvariable=self.response_cache_max_mb, width=10, increment=64, style='Dark.TSpinbox').grid(row=0, column=3, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Label(cache_frame, text="ℹ️ Ponowne uruchomienie kroku z tym samym modelem, promptem i danymi nie wysyła zapytań - odpowiedzi są czytane z cache/llm_responses.sqlite.",
+                  style='Dark.TLabel', foreground='#6b7280', wraplength=900).grid(row=1, column=0, columnspan=4, sticky=tk.W, padx=5, pady=(5, 0))
+
+        ttk.Checkbutton(cache_frame, text="Odpowiedzi strumieniowane w krokach 4-5 (kategorie w logach na bieżąco, przerwanie przy błędnym JSON)", variable=self.stream_responses, style='Dark.TCheckbutton').grid(row=2, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+        ttk.Checkbutton(cache_frame, text="Wymuszaj format JSON, gdy model go obsługuje (schemat JSON / tryb JSON według listy modeli)", variable=self.use_structured_output, style='Dark.TCheckbutton').grid(row=3, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+
         # Project Management Section
         project_frame = ttk.LabelFrame(content, text="Zarządzanie Projektem", padding="15", style='Dark.TLabelframe')
         project_frame.pack(fill="x", pady=(0, 15))
@@ -525,26 +632,32 @@ class NexusNavigationApp:
         ttk.Label(settings_frame, text="Filtr URL:", style='Dark.TLabel').grid(row=2, column=0, sticky=tk.W, padx=5, pady=2)
         filter_entry = ttk.Entry(settings_frame, textvariable=self.url_filter_pattern, width=30, style='Dark.TEntry')
         filter_entry.grid(row=2, column=1, padx=5, pady=2, sticky=tk.W)
-        ttk.Label(settings_frame, text="(np. '.html', '/product/')", style='Dark.TLabel', foreground='#6b7280').grid(row=2, column=2, sticky=tk.W, padx=5)
+        ttk.Label(settings_frame, text="(np. '.html', '/product/ !/blog/', 're:/p/\\d+', 'path:/sklep/')", style='Dark.TLabel', foreground='#6b7280').grid(row=2, column=2, sticky=tk.W, padx=5)
+
+        ttk.Label(settings_frame, text="Wątki sitemap:", style='Dark.TLabel').grid(row=3, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Spinbox(settings_frame, from_=1, to=32, textvariable=self.num_threads_sitemap, width=10, style='Dark.TSpinbox').grid(row=3, column=1, padx=5, pady=2, sticky=tk.W)
+        ttk.Label(settings_frame, text="(równoległe pobieranie sub-sitemap)", style='Dark.TLabel', foreground='#6b7280').grid(row=3, column=2, sticky=tk.W, padx=5)
+
+        ttk.Checkbutton(settings_frame, text="Cache sitemap (pobieraj tylko zmienione, zapisuj deltę URL-i)", variable=self.use_sitemap_cache, style='Dark.TCheckbutton').grid(row=4, column=1, sticky=tk.W, padx=5, pady=2, columnspan=2)
 
         # Separator
         separator = ttk.Separator(settings_frame, orient='horizontal')
-        separator.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
+        separator.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
 
         # Option 2: File upload
-        ttk.Label(settings_frame, text="Opcja B - Z pliku TXT:", style='Dark.TLabel', font=('Inter', 9, 'bold')).grid(row=4, column=0, sticky=tk.W, padx=5, pady=(5, 2), columnspan=3)
+        ttk.Label(settings_frame, text="Opcja B - Z pliku TXT:", style='Dark.TLabel', font=('Inter', 9, 'bold')).grid(row=6, column=0, sticky=tk.W, padx=5, pady=(5, 2), columnspan=3)
 
         self.upload_file_path = tk.StringVar()
-        ttk.Label(settings_frame, text="Plik z URL-ami:", style='Dark.TLabel').grid(row=5, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(settings_frame, text="Plik z URL-ami:", style='Dark.TLabel').grid(row=7, column=0, sticky=tk.W, padx=5, pady=2)
         file_label = tk.Label(settings_frame, textvariable=self.upload_file_path,
                              bg='#2a2a2a', fg='#e0e0e0', anchor='w',
                              font=('Inter', 9), relief=tk.FLAT, padx=5, pady=3)
-        file_label.grid(row=5, column=1, padx=5, pady=2, sticky=(tk.W, tk.E))
+        file_label.grid(row=7, column=1, padx=5, pady=2, sticky=(tk.W, tk.E))
 
         browse_file_btn = ttk.Button(settings_frame, text="Wybierz plik", command=self.browse_urls_file, style='Dark.TButton')
-        browse_file_btn.grid(row=5, column=2, padx=5, pady=2)
+        browse_file_btn.grid(row=7, column=2, padx=5, pady=2)
 
-        ttk.Label(settings_frame, text="ℹ️ Plik TXT z URL-ami (jeden URL na linię)", style='Dark.TLabel', foreground='#6b7280').grid(row=6, column=1, sticky=tk.W, padx=5, pady=(0, 5), columnspan=2)
+        ttk.Label(settings_frame, text="ℹ️ Plik TXT z URL-ami (jeden URL na linię)", style='Dark.TLabel', foreground='#6b7280').grid(row=8, column=1, sticky=tk.W, padx=5, pady=(0, 5), columnspan=2)
 
         settings_frame.columnconfigure(1, weight=1)
 
@@ -573,6 +686,27 @@ class NexusNavigationApp:
         ttk.Label(settings_frame, text="Powtórzenia:", style='Dark.TLabel').grid(row=0, column=2, sticky=tk.W, padx=(20,5), pady=5)
         ttk.Spinbox(settings_frame, from_=1, to=5, textvariable=self.max_retries_jina, width=10, style='Dark.TSpinbox').grid(row=0, column=3, padx=5, pady=5, sticky=tk.W)
 
+        ttk.Label(settings_frame, text="Silnik:", style='Dark.TLabel').grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Combobox(settings_frame, textvariable=self.jina_engine, values=["Wątki", "Asyncio"], width=8, state="readonly").grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Label(settings_frame, text="Współbieżność async:", style='Dark.TLabel').grid(row=1, column=2, sticky=tk.W, padx=(20,5), pady=5)
+        ttk.Spinbox(settings_frame, from_=1, to=1000, textvariable=self.async_concurrency_jina, width=10, increment=10, style='Dark.TSpinbox').grid(row=1, column=3, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Checkbutton(settings_frame, text="Wznów (pomiń URL-e już pobrane do content_website.jsonl.gz)", variable=self.resume_step2, style='Dark.TCheckbutton').grid(row=2, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+
+        ttk.Checkbutton(settings_frame, text="Cache stron (wspólny dla projektów, pobiera tylko brakujące i nieaktualne)", variable=self.use_page_cache, style='Dark.TCheckbutton').grid(row=3, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+
+        ttk.Label(settings_frame, text="Ważność cache (dni):", style='Dark.TLabel').grid(row=4, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(settings_frame, from_=0, to=365, textvariable=self.page_cache_ttl_days, width=10, style='Dark.TSpinbox').grid(row=4, column=1, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Label(settings_frame, text="Maks. rozmiar (MB):", style='Dark.TLabel').grid(row=4, column=2, sticky=tk.W, padx=(20,5), pady=5)
+        ttk.Spinbox(settings_frame, from_=64, to=100000, textvariable=self.page_cache_max_mb, width=10, increment=256, style='Dark.TSpinbox').grid(row=4, column=3, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Checkbutton(settings_frame, text="Usuń powtarzalne elementy stron (menu, stopki, banery cookie)", variable=self.strip_boilerplate, style='Dark.TCheckbutton').grid(row=5, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+
+        ttk.Label(settings_frame, text="Maks. długość treści:", style='Dark.TLabel').grid(row=5, column=2, sticky=tk.W, padx=(20,5), pady=5)
+        ttk.Spinbox(settings_frame, from_=0, to=1000000, textvariable=self.max_content_length, width=10, increment=1000, style='Dark.TSpinbox').grid(row=5, column=3, padx=5, pady=5, sticky=tk.W)
+
     def setup_step3(self, parent):
         """Krok 3: Ekstrakcja parametrów"""
         step_frame = ttk.LabelFrame(parent, text="Krok 3: Ekstrakcja parametrów produktów (AI)", padding="10", style='Dark.TLabelframe')
@@ -608,6 +742,19 @@ class NexusNavigationApp:
         ttk.Label(settings_frame, text="Powtórzenia:", style='Dark.TLabel').grid(row=1, column=2, sticky=tk.W, padx=(20,5), pady=5)
         ttk.Spinbox(settings_frame, from_=1, to=5, textvariable=self.max_retries_extract, width=10, style='Dark.TSpinbox').grid(row=1, column=3, padx=5, pady=5, sticky=tk.W)
 
+        ttk.Label(settings_frame, text="Procesy czyszczenia:", style='Dark.TLabel').grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(settings_frame, from_=0, to=32, textvariable=self.num_processes_clean, width=10, style='Dark.TSpinbox').grid(row=2, column=1, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(settings_frame, text="0 = bez puli procesów", style='Dark.TLabel', foreground='#6b7280').grid(row=2, column=2, sticky=tk.W, padx=5)
+
+        ttk.Checkbutton(settings_frame, text="Przyrostowo (tylko nowe i zmienione produkty, wyniki łączone z product_extraction.json)", variable=self.incremental_step3, style='Dark.TCheckbutton').grid(row=3, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+        ttk.Checkbutton(settings_frame, text="Dane strukturalne bez AI (okruszki i tabele parametrów ze strony; do modelu tylko strony bez nich)", variable=self.structured_step3, style='Dark.TCheckbutton').grid(row=5, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+
+        ttk.Label(settings_frame, text="Produkty na zapytanie:", style='Dark.TLabel').grid(row=4, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(settings_frame, from_=1, to=50, textvariable=self.extract_batch_size, width=10, style='Dark.TSpinbox').grid(row=4, column=1, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Label(settings_frame, text="Budżet tokenów:", style='Dark.TLabel').grid(row=4, column=2, sticky=tk.W, padx=(20,5), pady=5)
+        ttk.Spinbox(settings_frame, from_=1000, to=1000000, textvariable=self.extract_token_budget, width=10, increment=1000, style='Dark.TSpinbox').grid(row=4, column=3, padx=5, pady=5, sticky=tk.W)
+
         settings_frame.columnconfigure(1, weight=1)
 
     def setup_step4(self, parent):
@@ -639,12 +786,19 @@ class NexusNavigationApp:
 
         ttk.Label(settings_frame, text="💡 Zalecane: szybkie", style='Dark.TLabel', foreground='#6b7280').grid(row=0, column=2, sticky=tk.W, padx=5)
 
-        ttk.Label(settings_frame, text="Rozmiar paczki:", style='Dark.TLabel').grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
-        ttk.Spinbox(settings_frame, from_=10, to=100, textvariable=self.batch_size, width=10, increment=5, style='Dark.TSpinbox').grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(settings_frame, text="Maks. produktów w paczce:", style='Dark.TLabel').grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(settings_frame, from_=10, to=2000, textvariable=self.batch_size, width=10, increment=10, style='Dark.TSpinbox').grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
 
         ttk.Label(settings_frame, text="Wątki batch:", style='Dark.TLabel').grid(row=1, column=2, sticky=tk.W, padx=(20,5), pady=5)
         ttk.Spinbox(settings_frame, from_=1, to=10, textvariable=self.num_threads_batch, width=10, style='Dark.TSpinbox').grid(row=1, column=3, padx=5, pady=5, sticky=tk.W)
 
+        ttk.Label(settings_frame, text="Budżet tokenów paczki:", style='Dark.TLabel').grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(settings_frame, from_=0, to=2000000, textvariable=self.batch_token_budget, width=10, increment=1000, style='Dark.TSpinbox').grid(row=2, column=1, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(settings_frame, text="0 = według kontekstu modelu", style='Dark.TLabel', foreground='#6b7280').grid(row=2, column=2, sticky=tk.W, padx=5)
+
+        ttk.Checkbutton(settings_frame, text="Agreguj ekstrakcje lokalnie (tabela częstości kategorii i parametrów zamiast surowych rekordów)", variable=self.aggregate_step4, style='Dark.TCheckbutton').grid(row=3, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+        ttk.Checkbutton(settings_frame, text="Uzgadniaj nazwy kategorii przez AI przy scalaniu paczek (dodatkowe zapytanie na każde scalenie)", variable=self.reconcile_step4, style='Dark.TCheckbutton').grid(row=4, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+
         settings_frame.columnconfigure(1, weight=1)
 
     def setup_step5(self, parent):
@@ -679,6 +833,12 @@ class NexusNavigationApp:
         ttk.Label(settings_frame, text="Powtórzenia:", style='Dark.TLabel').grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
         ttk.Spinbox(settings_frame, from_=1, to=5, textvariable=self.max_retries_final, width=10, style='Dark.TSpinbox').grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
 
+        ttk.Checkbutton(settings_frame, text="Finalizuj każdą kategorię główną osobno (równolegle)", variable=self.shard_step5, style='Dark.TCheckbutton').grid(row=2, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(settings_frame, text="Wątki:", style='Dark.TLabel').grid(row=2, column=2, sticky=tk.W, padx=(20,5), pady=5)
+        ttk.Spinbox(settings_frame, from_=1, to=20, textvariable=self.num_threads_final, width=10, style='Dark.TSpinbox').grid(row=2, column=3, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Checkbutton(settings_frame, text="Uzgadniaj nazwy między gałęziami przez AI (jedno zapytanie z samymi nazwami)", variable=self.reconcile_step5, style='Dark.TCheckbutton').grid(row=3, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+
         settings_frame.columnconfigure(1, weight=1)
 
     def setup_tab_prompts(self):
@@ -712,6 +872,7 @@ class NexusNavigationApp:
         for step_key, step_name in [
             ("step3_extraction", "Krok 3: Ekstrakcja"),
             ("step4_structure", "Krok 4: Struktura"),
+            ("step4_reconcile", "Krok 4: Uzgadnianie nazw"),
             ("step5_finalization", "Krok 5: Finalizacja")
         ]:
             tab = ttk.Frame(prompts_notebook, style='Dark.TFrame')
@@ -781,7 +942,7 @@ class NexusNavigationApp:
 
         # Check step files
         step1_done = self.project_manager.check_file_exists("products.txt")
-        step2_done = self.project_manager.check_file_exists("content_website.json")
+        step2_done = resolve_corpus_path(self.project_manager.current_project_path) is not None
         step3_done = self.project_manager.check_file_exists("product_extraction.json")
         step4_done = self.project_manager.check_file_exists("categories_structure.json")
         step5_done = self.project_manager.check_file_exists("categories_final.json")
@@ -829,9 +990,13 @@ class NexusNavigationApp:
     def _load_models_thread(self):
         """Thread do ładowania modeli"""
         try:
-            self.openrouter_client = OpenRouterClient(self.openrouter_api_key.get())
+            self.openrouter_client = OpenRouterClient(
+                self.openrouter_api_key.get(),
+                pool_size=max(self.num_threads_extract.get(), self.num_threads_batch.get())
+            )
             models = self.openrouter_client.list_models()
             models.sort(key=lambda x: x.get('name', ''))
+            self.available_models = models
 
             model_options = [f"{m.get('name', 'Unknown')} ({m.get('id', '')})" for m in models]
 
@@ -881,6 +1046,32 @@ class NexusNavigationApp:
         match = re.search(r'\((.*?)\)$', selection)
         return match.group(1) if match else None
 
+    def get_response_format(self, model_id, step):
+        """
+        response_format dla kroku według możliwości modelu (supported_parameters)
+
+        Schemat z config/response_schemas.json przy structured outputs, tryb
+        JSON przy samym response_format, None gdy model nie obsługuje żadnego
+        lub opcja jest wyłączona.
+        """
+        if not self.use_structured_output.get():
+            return None
+        model = next((m for m in self.available_models if m.get('id') == model_id), None)
+        return self.openrouter_client.response_format_for(model, self.prompt_manager.get_response_schema(step))
+
+    def log_response_format(self, response_format):
+        """Wyświetl w logach wymuszony format odpowiedzi"""
+        if response_format:
+            kind = "schemat JSON" if response_format['type'] == 'json_schema' else "tryb JSON"
+            self.log(f"Format odpowiedzi: {kind} (structured outputs)")
+
+    def get_model_context_length(self, model_id, default=32000):
+        """Długość kontekstu modelu (w tokenach) z listy modeli OpenRouter"""
+        for model in self.available_models:
+            if model.get('id') == model_id:
+                return model.get('context_length') or model.get('top_provider', {}).get('context_length') or default
+        return default
+
     # ============ PROMPT MANAGEMENT ============
 
     def save_prompt_config(self):
@@ -972,8 +1163,8 @@ class NexusNavigationApp:
         if self.run_step2.get() and not self.run_step1.get() and not self.project_manager.check_file_exists("products.txt"):
             messagebox.showerror("Błąd", "Krok 2 wymaga wykonania kroku 1 (brak products.txt)")
             return
-        if self.run_step3.get() and not self.run_step2.get() and not self.project_manager.check_file_exists("content_website.json"):
-            messagebox.showerror("Błąd", "Krok 3 wymaga wykonania kroku 2 (brak content_website.json)")
+        if self.run_step3.get() and not self.run_step2.get() and resolve_corpus_path(self.project_manager.current_project_path) is None:
+            messagebox.showerror("Błąd", "Krok 3 wymaga wykonania kroku 2 (brak content_website.jsonl.gz)")
             return
         if self.run_step4.get() and not self.run_step3.get() and not self.project_manager.check_file_exists("product_extraction.json"):
             messagebox.showerror("Błąd", "Krok 4 wymaga wykonania kroku 3 (brak product_extraction.json)")
@@ -1065,6 +1256,9 @@ class NexusNavigationApp:
             if self.processing and self.run_step2.get() and (not resume or completed_steps < 2):
                 self.log("=== Krok 2: Pobranie opisów produktów ===")
                 self.execute_step2()
+                if not self.processing:
+                    # Przerwany krok 2 nie jest zaliczany - 'Kontynuuj' wznowi pobieranie
+                    return
                 completed_steps = max(completed_steps, 2)
                 self.last_completed_step = 2
                 self.update_progress(f"Krok 2 zakończony ({completed_steps}/{total_steps})", (completed_steps/total_steps)*100)
@@ -1134,6 +1328,14 @@ class NexusNavigationApp:
         sitemap_url = self.sitemap_url.get()
         upload_file = self.upload_file_path.get()
 
+        if not upload_file and not sitemap_url:
+            raise ValueError("Podaj URL sitemap (Opcja A) lub wybierz plik TXT (Opcja B)")
+
+        # Backup poprzedniej listy - podstawa do wyliczenia delty URL-i
+        previous_path = self.project_manager.backup_file("products.txt")
+        if previous_path:
+            self.log(f"📦 Backup: {previous_path}")
+
         if upload_file:
             # Option B: Load from file
             self.log("Opcja B: Wczytywanie URL-i z pliku...")
@@ -1148,35 +1350,44 @@ class NexusNavigationApp:
 
                 self.log(f"✓ Wczytano {len(urls)} URL-i z pliku")
                 self.log(f"✓ Skopiowano do: {output_path}")
-                self.project_manager.update_step_status("step1", True)
 
             except Exception as e:
                 raise ValueError(f"Błąd wczytywania pliku: {e}")
 
-        elif sitemap_url:
+        else:
             # Option A: Parse sitemap
             self.log("Opcja A: Parsowanie sitemap...")
 
-            parser = SitemapParser()
+            cache = None
+            if self.use_sitemap_cache.get():
+                cache = SitemapCache(self.project_manager.get_file_path("sitemap_cache"))
+
+            parser = SitemapParser(max_workers=self.num_threads_sitemap.get(), cache=cache)
 
             def progress_callback(msg):
                 self.log(msg)
 
-            urls = parser.parse_sitemap(
+            # Tryb strumieniowy - URL-e trafiają od razu do products.txt
+            url_count = parser.parse_to_file(
                 sitemap_url,
+                str(output_path),
                 self.url_filter_pattern.get() if self.url_filter_pattern.get() else None,
                 progress_callback
             )
 
-            # Save to file
-            parser.save_to_file(str(output_path))
-
-            self.log(f"✓ Znaleziono {len(urls)} URL-i produktów")
+            self.log(f"✓ Znaleziono {url_count} URL-i produktów")
             self.log(f"✓ Zapisano do: {output_path}")
-            self.project_manager.update_step_status("step1", True)
 
-        else:
-            raise ValueError("Podaj URL sitemap (Opcja A) lub wybierz plik TXT (Opcja B)")
+        if previous_path:
+            added, removed = write_url_delta(
+                str(previous_path),
+                str(output_path),
+                str(self.project_manager.get_file_path("products_added.txt")),
+                str(self.project_manager.get_file_path("products_removed.txt"))
+            )
+            self.log(f"✓ Zmiany względem poprzedniej listy: +{added} / -{removed} (products_added.txt, products_removed.txt)")
+
+        self.project_manager.update_step_status("step1", True)
 
     def execute_step2(self):
         """Wykonaj krok 2 - pobieranie treści z Jina"""
@@ -1187,28 +1398,118 @@ class NexusNavigationApp:
 
         # Initialize Jina client
         if not self.jina_client:
-            self.jina_client = JinaClient(self.jina_api_key.get())
+            self.jina_client = JinaClient(self.jina_api_key.get(), pool_size=self.num_threads_jina.get())
+
+        # Checkpoint: append-only skompresowany JSONL, wznowienie pomija poprawnie pobrane URL-e
+        output_path = self.project_manager.get_file_path(CORPUS_GZ)
+        if not self.resume_step2.get() and output_path.exists():
+            backup_path = self.project_manager.backup_file(CORPUS_GZ)
+            self.log(f"📦 Backup: {backup_path}")
+            output_path.unlink()
+            if index_path(output_path).exists():
+                index_path(output_path).unlink()
+
+        # Projekt ze starszym formatem korpusu - konwersja, żeby wznowienie nie traciło postępu
+        legacy_path = resolve_corpus_path(self.project_manager.current_project_path)
+        if self.resume_step2.get() and legacy_path and not is_compressed(legacy_path):
+            converted = convert_corpus(legacy_path, output_path)
+            self.log(f"✓ Przekonwertowano {legacy_path.name} do {CORPUS_GZ} ({converted} rekordów)")
+
+        resumed = output_path.exists()
+        completed = load_completed_urls(output_path)
+        pending_urls = [url for url in urls if url_key(url) not in completed]
+        already_done = len(urls) - len(pending_urls)
+        if already_done:
+            self.log(f"Wznawianie: {already_done} URL-i już pobranych, pozostało {len(pending_urls)}")
+        del completed
+
+        total = len(urls)
+        stats = {"ok": 0, "errors": 0}
 
         # Fetch content
-        def progress_callback(processed, total):
-            self.log(f"Przetworzono {processed}/{total} URL-i")
-            progress = (processed / total) * 100
-            self.update_progress(f"Pobieranie treści: {processed}/{total}", progress)
-
-        results = self.jina_client.fetch_urls_parallel(
-            urls,
-            num_threads=self.num_threads_jina.get(),
-            max_retries=self.max_retries_jina.get(),
-            progress_callback=progress_callback,
-            stop_flag_callback=lambda: self.processing
+        def progress_callback(processed, _pending_total):
+            done = already_done + processed
+            self.log(f"Przetworzono {done}/{total} URL-i")
+            progress = (done / total) * 100
+            self.update_progress(f"Pobieranie treści: {done}/{total}", progress)
+
+        use_async = self.jina_engine.get() == "Asyncio"
+        self.jina_client.rate_limiter = self.create_rate_limiter(
+            self.jina_requests_per_second.get(),
+            self.async_concurrency_jina.get() if use_async else self.num_threads_jina.get()
         )
 
-        # Save to file
-        output_path = self.project_manager.get_file_path("content_website.json")
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
+        # Cache stron wspólny dla wszystkich projektów (poza folderem projektu)
+        page_cache = None
+        if self.use_page_cache.get():
+            page_cache = PageCache(
+                ttl_days=self.page_cache_ttl_days.get(),
+                max_size_mb=self.page_cache_max_mb.get()
+            )
+        self.jina_client.page_cache = page_cache
+
+        # Usuwanie szablonu strony przed zapisem (cache stron przechowuje pełną treść)
+        stripper = None
+        if self.strip_boilerplate.get() or self.max_content_length.get():
+            stripper = BoilerplateStripper(
+                threshold=0.6 if self.strip_boilerplate.get() else None,
+                max_length=self.max_content_length.get()
+            )
+
+        with CorpusWriter(output_path) as writer:
+            def write_result(result):
+                writer.write(result)
+                stats["ok" if is_success(result) else "errors"] += 1
+
+            def result_callback(result):
+                for record in stripper.feed(result) if stripper else [result]:
+                    write_result(record)
+
+            if use_async:
+                self.log(f"Silnik asyncio (współbieżność: {self.async_concurrency_jina.get()})")
+                self.jina_client.fetch_urls_async(
+                    pending_urls,
+                    concurrency=self.async_concurrency_jina.get(),
+                    max_retries=self.max_retries_jina.get(),
+                    progress_callback=progress_callback,
+                    stop_flag_callback=lambda: self.processing,
+                    result_callback=result_callback
+                )
+            else:
+                self.jina_client.fetch_urls_parallel(
+                    pending_urls,
+                    num_threads=self.num_threads_jina.get(),
+                    max_retries=self.max_retries_jina.get(),
+                    progress_callback=progress_callback,
+                    stop_flag_callback=lambda: self.processing,
+                    result_callback=result_callback
+                )
+
+            # Strony zbuforowane na czas zbierania statystyk domeny (także po Stop)
+            if stripper:
+                for record in stripper.flush():
+                    write_result(record)
+
+        self.log_rate_limiter(self.jina_client.rate_limiter)
+        if stripper and stripper.chars_before:
+            self.log(f"Usunięto {stripper.saved_ratio:.0%} treści (szablon strony / limit długości)")
+        if page_cache:
+            cache_stats = page_cache.stats()
+            self.log(f"Cache stron: {cache_stats['hits']} z cache, {cache_stats['misses']} z API "
+                     f"({cache_stats['entries']} stron, {cache_stats['size_mb']} MB)")
+            page_cache.close()
+            self.jina_client.page_cache = None
+        self.log(f"✓ Pobrano treść dla {stats['ok']} URL-i (błędy: {stats['errors']})")
+
+        if not self.processing:
+            self.log(f"⏸ Przerwano - postęp zapisany w {output_path}, kolejne uruchomienie wznowi pobieranie")
+            return
+
+        # Po wznowieniu: usuń nieaktualne rekordy (stare błędy, URL-e spoza products.txt)
+        if resumed:
+            kept = compact_corpus(output_path, keep_keys={url_key(url) for url in urls})
+            self.log(f"✓ Uporządkowano plik wyników ({kept} rekordów)")
 
-        self.log(f"✓ Pobrano treść dla {len(results)} URL-i")
         self.log(f"✓ Zapisano do: {output_path}")
         self.project_manager.update_step_status("step2", True)
 
@@ -1220,22 +1521,24 @@ class NexusNavigationApp:
         if backup_path:
             self.log(f"📦 Backup: {backup_path}")
 
-        # Load data
-        input_path = self.project_manager.get_file_path("content_website.json")
-        with open(input_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Korpus jest czytany strumieniowo - w pamięci tylko rekordy w oknie zadań
+        input_path = resolve_corpus_path(self.project_manager.current_project_path)
 
         # Get prompt
         system_prompt = self.prompt_manager.get_prompt("step3_extraction")
+        self.json_parser = TolerantJsonParser()
+        # Schemat dotyczy pojedynczego produktu - paczki zwracają tablicę i idą bez niego
+        response_format = self.get_response_format(model_id, "step3_extraction")
+        self.log_response_format(response_format)
+        max_tokens = STEP3_STRUCTURED_MAX_TOKENS if response_format else STEP3_MAX_TOKENS
 
         # Process
         def process_item(item):
             if not self.processing:
                 return None
 
-            url = item['url']
-            content = item['content']
-            cleaned_content = self.clean_content(content)
+            record, cleaned_content = item
+            url = record['url']
 
             messages = [
                 {"role": "system", "content": system_prompt},
@@ -1244,11 +1547,15 @@ class NexusNavigationApp:
 
             for attempt in range(self.max_retries_extract.get() + 1):
                 try:
-                    response = self.openrouter_client.chat_completion(model_id, messages)
+                    # Ponowienie omija cache - zapisana odpowiedź mogła być niepoprawna
+                    response = self.openrouter_client.chat_completion(
+                        model_id, messages, max_tokens=max_tokens, use_cache=attempt == 0,
+                        response_format=response_format
+                    )
                     raw_output = self.openrouter_client.get_response_text(response)
-                    cleaned_output = self.clean_field(raw_output)
-                    json_data = json.loads(cleaned_output)
-                    return {"url": url, "extraction": json_data}
+                    # Drobne błędy JSON (przecinki, urwany koniec) są naprawiane bez ponawiania
+                    json_data = self.json_parser.loads(raw_output)
+                    return {"url": url, "extraction": json_data, "fingerprint": record['fingerprint']}
                 except json.JSONDecodeError as e:
                     if attempt < self.max_retries_extract.get():
                         self.log(f"Powtarzanie {url} (próba {attempt + 1})")
@@ -1258,44 +1565,143 @@ class NexusNavigationApp:
                 except Exception as e:
                     if attempt < self.max_retries_extract.get():
                         self.log(f"Błąd {url}: {e}")
+                        self.openrouter_client.rate_limiter.wait_before_retry(attempt, e)
                     else:
                         return {"url": url, "extraction": {}}
             return {"url": url, "extraction": {}}
 
-        results = []
-        total = len(data)
-        processed = 0
+        def process_batch(batch):
+            """Ekstrakcja kilku produktów w jednym zapytaniu; pominięte w odpowiedzi ponawiane pojedynczo"""
+            if len(batch) == 1:
+                result = process_item(batch[0])
+                return [result] if result else []
+            if not self.processing:
+                return []
 
-        with ThreadPoolExecutor(max_workers=self.num_threads_extract.get()) as executor:
-            futures = []
+            ids = [f"p{i + 1}" for i in range(len(batch))]
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": build_batch_message(zip(ids, (cleaned for _, cleaned in batch)))}
+            ]
 
-            # Submit tasks
-            for item in data:
-                if not self.processing:
+            extractions = {}
+            for attempt in range(self.max_retries_extract.get() + 1):
+                try:
+                    response = self.openrouter_client.chat_completion(
+                        model_id, messages, max_tokens=max(4000, 1000 * len(batch)), use_cache=attempt == 0
+                    )
+                    raw_output = self.openrouter_client.get_response_text(response)
+                    # Urwana odpowiedź traci tylko ostatni produkt - zostanie ponowiony pojedynczo
+                    extractions = parse_batch_response(self.json_parser.loads(raw_output), ids)
                     break
-                future = executor.submit(process_item, item)
-                futures.append(future)
+                except json.JSONDecodeError:
+                    if attempt < self.max_retries_extract.get():
+                        self.log(f"Powtarzanie paczki {len(batch)} produktów (próba {attempt + 1})")
+                except Exception as e:
+                    if attempt < self.max_retries_extract.get():
+                        self.log(f"Błąd paczki: {e}")
+                        self.openrouter_client.rate_limiter.wait_before_retry(attempt, e)
+
+            missing = len(batch) - len(extractions)
+            if missing:
+                self.log(f"Paczka: brak wyników dla {missing}/{len(batch)} produktów - ponawianie pojedynczo")
+
+            results = []
+            for product_id, item in zip(ids, batch):
+                record = item[0]
+                if product_id in extractions:
+                    results.append({"url": record['url'], "extraction": extractions[product_id],
+                                    "fingerprint": record['fingerprint']})
+                else:
+                    result = process_item(item)
+                    if result:
+                        results.append(result)
+            return results
 
-            # Collect results
-            for future in as_completed(futures):
-                if not self.processing:
-                    # Cancel remaining futures
-                    for f in futures:
-                        f.cancel()
-                    break
-                result = future.result()
-                if result:
-                    results.append(result)
+        # Tryb przyrostowy: produkty z niezmienionym odciskiem (treść, model, prompt)
+        # zachowują poprzednią ekstrakcję, URL-e usunięte z korpusu wypadają
+        output_path = self.project_manager.get_file_path(output_file)
+        previous = {}
+        if self.incremental_step3.get() and output_path.exists():
+            with open(output_path, 'r', encoding='utf-8') as f:
+                previous = {item['url']: item for item in json.load(f)}
+        use_structured = self.structured_step3.get()
+        fingerprint_context = f"{model_id}\0{system_prompt}" + ("\0structured" if use_structured else "")
+
+        results = {}
+        reused = 0
+        structured = 0
+        total = count_corpus(input_path)
+        processed = 0
+
+        def pending_records():
+            nonlocal processed, reused, structured
+            for record in iter_corpus(input_path):
+                fingerprint = content_fingerprint(record.get('content') or '', fingerprint_context)
+                prev = previous.get(record['url'])
+                if prev is not None:
+                    # Poprzedni wynik zostaje, jeśli nowa ekstrakcja się nie uda
+                    results[record['url']] = prev
+                    if prev.get('fingerprint') == fingerprint and prev.get('extraction'):
+                        reused += 1
+                        processed += 1
+                        continue
+                # Strony z okruszkami i parametrami nie wymagają zapytania do modelu
+                extraction = extract_structured(record.get('content') or '', record['url']) if use_structured else None
+                if extraction:
+                    results[record['url']] = {"url": record['url'], "extraction": extraction,
+                                              "fingerprint": fingerprint, "source": "structured"}
+                    structured += 1
+                    processed += 1
+                    continue
+                yield {**record, 'fingerprint': fingerprint}
+
+        rate_limiter = self.create_rate_limiter(self.openrouter_requests_per_second.get(), self.num_threads_extract.get())
+        self.openrouter_client.rate_limiter = rate_limiter
+        self.attach_response_cache()
+        num_workers = rate_limiter.worker_count(self.num_threads_extract.get())
+        self.openrouter_client.ensure_pool_size(num_workers)
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            # Czyszczenie treści w wątku czytającym korpus lub w puli procesów
+            items = iter_cleaned(pending_records(), processes=self.num_processes_clean.get())
+            # Paczki produktów w budżecie tokenów (rozmiar 1 = jeden produkt na zapytanie)
+            batches = pack_by_budget(
+                items,
+                cost=lambda item: estimate_tokens(item[1]),
+                budget=max(1, self.extract_token_budget.get() - estimate_tokens(system_prompt)),
+                max_items=max(1, self.extract_batch_size.get())
+            )
+            # Ograniczone okno zadań zamiast zlecania wszystkich produktów naraz
+            for batch_results in iter_bounded(executor, process_batch, batches, num_workers * 2,
+                                              stop_flag_callback=lambda: self.processing):
+                for result in batch_results:
+                    if result['extraction'] or result['url'] not in results:
+                        results[result['url']] = result
                     processed += 1
                     if processed % 10 == 0 or processed == total:
                         self.log(f"Przetworzono {processed}/{total}")
                         self.update_progress(f"Ekstrakcja: {processed}/{total}", (processed/total)*100)
 
+        if previous:
+            if self.processing:
+                removed = sum(1 for url in previous if url not in results)
+                self.log(f"Przyrostowo: {reused} bez zmian, {len(results) - reused} nowych/zmienionych, "
+                         f"{removed} usuniętych")
+            else:
+                # Przerwano - nieodwiedzone produkty zachowują poprzednią ekstrakcję
+                for url, item in previous.items():
+                    results.setdefault(url, item)
+
+        if use_structured:
+            self.log(f"Dane strukturalne: {structured} produktów bez zapytania do modelu")
+
         # Save
-        output_path = self.project_manager.get_file_path(output_file)
         with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
+            json.dump(list(results.values()), f, indent=2, ensure_ascii=False)
 
+        self.log_rate_limiter(rate_limiter)
+        self.log_response_cache()
+        self.log_json_repair()
         self.log(f"✓ Zapisano ekstrakcję dla {len(results)} produktów")
         self.project_manager.update_step_status("step3", True)
 
@@ -1314,96 +1720,186 @@ class NexusNavigationApp:
 
         # Get prompt
         system_prompt = self.prompt_manager.get_prompt("step4_structure")
+        self.json_parser = TolerantJsonParser(roots='{')
+        response_format = self.get_response_format(model_id, "step4_structure")
+        self.log_response_format(response_format)
+
+        data_intro = (
+            "Here is the aggregated product data. Each entry is one main category with the number of products, "
+            "subcategory paths with product counts and the most common product parameter values:"
+            if self.aggregate_step4.get() else "Here is the product data:"
+        )
 
         # Batch processing function
         def get_navigation_json(batch):
             if not self.processing:
                 return {}
 
-            filtered_extractions = [item['extraction'] for item in batch
-                                   if 'extraction' in item and
-                                   item['extraction'].get('product_category', {}).get('main_category') is not None]
-            if not filtered_extractions:
-                return {}
-
-            batch_data = json.dumps(filtered_extractions, ensure_ascii=False)
+            batch_data = json.dumps(batch, ensure_ascii=False)
             messages = [
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Here is the product data:\n{batch_data}"}
+                {"role": "user", "content": f"{data_intro}\n{batch_data}"}
             ]
 
             for attempt in range(self.max_retries_batch.get() + 1):
+                if not self.processing:
+                    break
                 try:
-                    response = self.openrouter_client.chat_completion(model_id, messages)
-                    raw_output = self.openrouter_client.get_response_text(response)
-                    cleaned_output = self.clean_field(raw_output)
-                    json_data = json.loads(cleaned_output)
-                    return json_data
+                    if self.stream_responses.get():
+                        # Błędny lub urwany JSON przerywa zapytanie w trakcie odbioru
+                        return self.stream_json_completion(
+                            model_id, messages, STEP4_MAX_TOKENS, use_cache=attempt == 0,
+                            item_key="main_navigation", response_format=response_format
+                        )
+                    response = self.openrouter_client.chat_completion(
+                        model_id, messages, max_tokens=STEP4_MAX_TOKENS, use_cache=attempt == 0,
+                        response_format=response_format
+                    )
+                    # Odpowiedź niedokończona (limit tokenów, zerwane generowanie) nie jest
+                    # "naprawiana" - zgubiłaby kategorie
+                    return self.json_parser.loads(
+                        self.openrouter_client.get_response_text(response),
+                        allow_truncated=self.openrouter_client.get_finish_reason(response) == 'stop'
+                    )
+                except InterruptedError:
+                    # Stop w trakcie odbioru strumienia - bez ponawiania
+                    break
                 except Exception as e:
+                    if self.openrouter_client.is_context_length_error(e) and len(batch) > 1:
+                        # Szacunek tokenów był za niski - ta sama paczka znów by się nie zmieściła
+                        half = len(batch) // 2
+                        self.log(f"Paczka przekracza kontekst modelu - dzielenie na {half} + {len(batch) - half}")
+                        parts = [get_navigation_json(batch[:half]), get_navigation_json(batch[half:])]
+                        return {"main_navigation": [node for part in parts if isinstance(part, dict)
+                                                    for node in part.get('main_navigation') or []]}
                     if attempt < self.max_retries_batch.get():
                         self.log(f"Powtarzanie batch (próba {attempt + 1})")
+                        if not isinstance(e, ValueError):
+                            self.openrouter_client.rate_limiter.wait_before_retry(attempt, e)
                     else:
                         self.log(f"Błąd batch: {e}")
                         return {}
             return {}
 
-        # Create batches
-        batch_size = self.batch_size.get()
-        batches = [data[i:i + batch_size] for i in range(0, len(data), batch_size)]
+        # Produkty bez kategorii nie są wysyłane
+        extractions = [item['extraction'] for item in data
+                       if 'extraction' in item and
+                       item['extraction'].get('product_category', {}).get('main_category')]
+        del data
+        aggregate = self.aggregate_step4.get()
+
+        # Paczki pakowane według szacowanej liczby tokenów: kontekst modelu minus
+        # prompt systemowy, miejsce na odpowiedź i 10% zapasu na błąd szacunku
+        token_budget = self.batch_token_budget.get()
+        if not token_budget:
+            context_length = self.get_model_context_length(model_id)
+            token_budget = int(context_length * 0.9) - estimate_tokens(system_prompt) - STEP4_MAX_TOKENS
+        token_budget = max(1000, token_budget)
+        item_cost = lambda item: estimate_tokens(json.dumps(item, ensure_ascii=False)) + 1
+
+        output_cost, output_budget = None, 0
+        if aggregate:
+            # Tabela częstości zamiast surowych rekordów - po jednym wpisie na kategorię główną.
+            # Paczka jest ograniczona także szacowaną odpowiedzią (połowa max_tokens), żeby
+            # struktura nawigacji dla paczki mieściła się w limicie odpowiedzi
+            raw_tokens = sum(item_cost(extraction) for extraction in extractions)
+            groups = ExtractionAggregator().add_all(extractions).groups()
+            output_cost, output_budget = navigation_tokens, STEP4_MAX_TOKENS // 2
+            items = list(split_oversized(groups, item_cost, token_budget, output_cost, output_budget))
+            self.log(f"Agregacja: {len(extractions)} produktów -> {len(groups)} kategorii głównych, "
+                     f"~{sum(map(item_cost, items))} tokenów zamiast ~{raw_tokens}")
+            max_items = 0
+        else:
+            items = extractions
+            max_items = self.batch_size.get()
+        del extractions
+
+        batches = list(pack_by_budget(items, cost=item_cost, budget=token_budget, max_items=max_items,
+                                      output_cost=output_cost, output_budget=output_budget))
+        self.log(f"Paczki: {len(batches)} (budżet {token_budget} tokenów)")
 
         partial_navs = []
         processed = 0
         total = len(batches)
 
-        with ThreadPoolExecutor(max_workers=self.num_threads_batch.get()) as executor:
-            futures = []
-
-            # Submit tasks
-            for batch in batches:
-                if not self.processing:
-                    break
-                future = executor.submit(get_navigation_json, batch)
-                futures.append(future)
-
-            # Collect results
-            for future in as_completed(futures):
-                if not self.processing:
-                    # Cancel remaining futures
-                    for f in futures:
-                        f.cancel()
-                    break
-                partial = future.result()
+        rate_limiter = self.create_rate_limiter(self.openrouter_requests_per_second.get(), self.num_threads_batch.get())
+        self.openrouter_client.rate_limiter = rate_limiter
+        self.attach_response_cache()
+        num_workers = rate_limiter.worker_count(self.num_threads_batch.get())
+        self.openrouter_client.ensure_pool_size(num_workers)
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            # Ograniczone okno zadań zamiast zlecania wszystkich paczek naraz
+            for partial in iter_bounded(executor, get_navigation_json, batches, num_workers * 2,
+                                        stop_flag_callback=lambda: self.processing):
                 if partial:
                     partial_navs.append(partial)
                 processed += 1
                 self.log(f"Przetworzono batch {processed}/{total}")
                 self.update_progress(f"Budowa struktury: {processed}/{total}", (processed/total)*100)
 
-        # Merge results
-        merged = defaultdict(set)
-        for nav in partial_navs:
-            for main in nav.get('main_navigation', []):
-                main_name = main['name']
-                for sub in main.get('subcategories', []):
-                    sub_name = sub['name']
-                    merged[main_name].add(sub_name)
-
-        main_navigation = []
-        for main_name in sorted(merged.keys()):
-            subcategories = [{"name": sub_name} for sub_name in sorted(merged[main_name])]
-            main_navigation.append({
-                "name": main_name,
-                "subcategories": subcategories
-            })
+        # Scalanie parami (tree-reduce) z zachowaniem pełnej głębokości drzewa
+        reconcile = None
+        if self.reconcile_step4.get() and self.processing:
+            reconcile = lambda groups: self.reconcile_category_names(model_id, groups)
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            main_navigation = tree_reduce(
+                [nav.get('main_navigation', []) for nav in partial_navs if isinstance(nav, dict)],
+                reconcile=reconcile,
+                executor=executor
+            )
+        self.log(f"Scalono {len(partial_navs)} struktur częściowych: {len(main_navigation)} kategorii głównych")
 
         # Save
         output_path = self.project_manager.get_file_path(output_file)
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump({"main_navigation": main_navigation}, f, indent=2, ensure_ascii=False)
 
+        self.log_rate_limiter(rate_limiter)
+        self.log_response_cache()
+        self.log_json_repair()
         self.log(f"✓ Zapisano strukturę kategorii")
         self.project_manager.update_step_status("step4", True)
 
+    def reconcile_category_names(self, model_id, groups):
+        """
+        Uzgodnij nazwy bliskich duplikatów w grupach kategorii rodzeństwa (jedno zapytanie)
+
+        Args:
+            model_id: Model kroku 4
+            groups: Słownik klucz grupy -> lista nazw kategorii
+
+        Returns:
+            Słownik klucz grupy -> {nazwa: nazwa docelowa} (pusty przy błędzie)
+        """
+        if not self.processing:
+            return {}
+
+        messages = [
+            {"role": "system", "content": self.prompt_manager.get_prompt("step4_reconcile")},
+            {"role": "user", "content": json.dumps(groups, ensure_ascii=False)}
+        ]
+        response_format = self.get_response_format(model_id, "step4_reconcile")
+        for attempt in range(self.max_retries_batch.get() + 1):
+            if not self.processing:
+                break
+            try:
+                response = self.openrouter_client.chat_completion(
+                    model_id, messages, max_tokens=STEP4_MAX_TOKENS, use_cache=attempt == 0,
+                    response_format=response_format
+                )
+                renames = self.json_parser.loads(self.openrouter_client.get_response_text(response))
+                if not isinstance(renames, dict):
+                    raise ValueError("Odpowiedź nie jest obiektem JSON")
+                return {key: value for key, value in renames.items() if isinstance(value, dict)}
+            except Exception as e:
+                if attempt < self.max_retries_batch.get():
+                    if not isinstance(e, ValueError):
+                        self.openrouter_client.rate_limiter.wait_before_retry(attempt, e)
+                else:
+                    # Scalanie działa dalej bez uzgodnienia nazw
+                    self.log(f"Błąd uzgadniania nazw: {e}")
+        return {}
+
     def execute_step5(self, model_id):
         """Wykonaj krok 5 - finalizacja"""
         # Backup
@@ -1419,8 +1915,60 @@ class NexusNavigationApp:
 
         # Get prompt
         system_prompt = self.prompt_manager.get_prompt("step5_finalization")
+        self.json_parser = TolerantJsonParser(roots='{')
+        self.log_response_format(self.get_response_format(model_id, "step5_finalization"))
 
-        data_str = json.dumps(loaded_data, ensure_ascii=False)
+        # Kategorie odebrane do tej pory (odpowiedzi strumieniowane)
+        partial = PartialResultWriter(self.project_manager.get_file_path("categories_final.partial.json"))
+
+        branches = loaded_data.get('main_navigation') if isinstance(loaded_data, dict) else None
+        if self.shard_step5.get() and isinstance(branches, list) and len(branches) > 1:
+            optimized_json = self.finalize_by_branch(model_id, system_prompt, branches, partial)
+        else:
+            self.openrouter_client.rate_limiter = self.create_rate_limiter(self.openrouter_requests_per_second.get(), 1)
+            self.attach_response_cache()
+            optimized_json = self.request_finalization(model_id, system_prompt, loaded_data, partial=partial)
+
+        if optimized_json is None:
+            return
+
+        # Save
+        output_path = self.project_manager.get_file_path(output_file)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(optimized_json, f, indent=2, ensure_ascii=False)
+
+        partial.discard()
+        self.log("✓ Zapisano finalną strukturę kategorii")
+
+        # Display structure
+        categories = optimized_json.get('categories', [])
+        self.log("\n=== Finalna Struktura Kategorii ===")
+        self.display_structure(categories)
+
+        self.project_manager.update_step_status("step5", True)
+        self.log_response_cache()
+        self.log_json_repair()
+
+    def request_finalization(self, model_id, system_prompt, data, label="", partial=None):
+        """
+        Zapytanie finalizacji dla struktury (całej lub jednej gałęzi) z powtórzeniami
+
+        Przy odpowiedziach strumieniowanych kategorie są wyświetlane w logach
+        i zapisywane do pliku częściowego w miarę odbioru.
+
+        Args:
+            model_id: Model kroku 5
+            system_prompt: Prompt finalizacji
+            data: Struktura kategorii do optymalizacji
+            label: Prefiks komunikatów w logach (np. nazwa gałęzi)
+            partial: PartialResultWriter dla kategorii odebranych do tej pory
+
+        Returns:
+            Zoptymalizowana struktura JSON lub None przy błędzie/przerwaniu
+        """
+        prefix = f"{label}: " if label else ""
+        response_format = self.get_response_format(model_id, "step5_finalization")
+        data_str = json.dumps(data, ensure_ascii=False)
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"Here is the input list:\n{data_str}"}
@@ -1430,73 +1978,186 @@ class NexusNavigationApp:
             if not self.processing:
                 break
             try:
-                self.log(f"Optymalizacja (próba {attempt + 1})...")
-                response = self.openrouter_client.chat_completion(model_id, messages, max_tokens=16000)
+                self.log(f"{prefix}Optymalizacja (próba {attempt + 1})...")
+                if self.stream_responses.get():
+                    if partial is not None:
+                        partial.reset(label)
+
+                    def on_category(category):
+                        if not isinstance(category, dict):
+                            return
+                        if partial is not None:
+                            partial.add(category, label)
+                        self.log(f"  {prefix}→ {category.get('name', '')} "
+                                 f"({len(category.get('subcategories') or [])} podkategorii)")
+
+                    return self.stream_json_completion(
+                        model_id, messages, 16000, use_cache=attempt == 0,
+                        item_key="categories", on_item=on_category, response_format=response_format
+                    )
+
+                response = self.openrouter_client.chat_completion(
+                    model_id, messages, max_tokens=16000, use_cache=attempt == 0, response_format=response_format
+                )
                 raw_output = self.openrouter_client.get_response_text(response)
 
-                self.log(f"Otrzymano odpowiedź ({len(raw_output)} znaków)")
-
-                cleaned_output = self.clean_field(raw_output)
+                self.log(f"{prefix}Otrzymano odpowiedź ({len(raw_output)} znaków)")
 
-                # Extract JSON
-                json_match = re.search(r'\{[\s\S]*\}', cleaned_output)
-                if json_match:
-                    cleaned_output = json_match.group(0)
+                # Tekst wokół JSON i drobne błędy są naprawiane lokalnie; odpowiedź
+                # niedokończona (limit tokenów, zerwane generowanie) wymaga ponowienia
+                return self.json_parser.loads(
+                    raw_output,
+                    allow_truncated=self.openrouter_client.get_finish_reason(response) == 'stop'
+                )
 
-                optimized_json = json.loads(cleaned_output)
-
-                # Save
-                output_path = self.project_manager.get_file_path(output_file)
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(optimized_json, f, indent=2, ensure_ascii=False)
-
-                self.log("✓ Zapisano finalną strukturę kategorii")
-
-                # Display structure
-                categories = optimized_json.get('categories', [])
-                self.log("\n=== Finalna Struktura Kategorii ===")
-                self.display_structure(categories)
-
-                self.project_manager.update_step_status("step5", True)
-                return
-
-            except json.JSONDecodeError as e:
+            except InterruptedError:
+                # Stop w trakcie odbioru strumienia - bez ponawiania
+                break
+            except (json.JSONDecodeError, JsonStreamError) as e:
                 if attempt < self.max_retries_final.get():
-                    self.log(f"Powtarzanie finalizacji (próba {attempt + 1})")
+                    self.log(f"{prefix}Powtarzanie finalizacji (próba {attempt + 1}): {e}")
                     messages[1]['content'] = f"Output ONLY valid JSON. No text.\n\n{data_str}"
                 else:
-                    self.log(f"❌ Nie udało się sfinalizować: {e}")
+                    self.log(f"❌ {prefix}Nie udało się sfinalizować: {e}")
             except Exception as e:
                 if attempt < self.max_retries_final.get():
-                    self.log(f"Powtarzanie (próba {attempt + 1}): {e}")
+                    self.log(f"{prefix}Powtarzanie (próba {attempt + 1}): {e}")
+                    self.openrouter_client.rate_limiter.wait_before_retry(attempt, e)
                 else:
-                    self.log(f"❌ Błąd finalizacji: {e}")
+                    self.log(f"❌ {prefix}Błąd finalizacji: {e}")
+        return None
+
+    def finalize_by_branch(self, model_id, system_prompt, branches, partial=None):
+        """
+        Finalizacja równoległa - osobne zapytanie dla każdej kategorii głównej
+
+        Każda gałąź jest optymalizowana niezależnie (mniejsze odpowiedzi, brak
+        obcinania przy limicie max_tokens, powtórzenie dotyczy jednej gałęzi),
+        a na końcu gałęzie są łączone z deduplikacją nazw między nimi.
+
+        Returns:
+            Struktura {"categories": [...]} lub None po przerwaniu
+        """
+        total = len(branches)
+        self.log(f"Finalizacja {total} gałęzi równolegle")
+
+        def finalize_branch(indexed):
+            index, branch = indexed
+            name = branch.get('name', '') if isinstance(branch, dict) else ''
+            result = self.request_finalization(model_id, system_prompt, {"main_navigation": [branch]},
+                                               label=name, partial=partial)
+            categories = result.get('categories') if isinstance(result, dict) else None
+            if not isinstance(categories, list) and self.processing:
+                # Gałąź zostaje w postaci z kroku 4 zamiast zniknąć z wyniku
+                self.log(f"⚠️ {name}: pozostawiono strukturę z kroku 4")
+                categories = [branch]
+            return index, categories
+
+        rate_limiter = self.create_rate_limiter(self.openrouter_requests_per_second.get(), self.num_threads_final.get())
+        self.openrouter_client.rate_limiter = rate_limiter
+        self.attach_response_cache()
+        num_workers = rate_limiter.worker_count(self.num_threads_final.get())
+        self.openrouter_client.ensure_pool_size(num_workers)
+
+        optimized = {}
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            for index, categories in iter_bounded(executor, finalize_branch, enumerate(branches), num_workers * 2,
+                                                  stop_flag_callback=lambda: self.processing):
+                optimized[index] = categories or []
+                self.update_progress(f"Finalizacja: {len(optimized)}/{total}", (len(optimized)/total)*100)
+
+        self.log_rate_limiter(rate_limiter)
+        if not self.processing or len(optimized) < total:
+            return None
+
+        # Deduplikacja między gałęziami (lokalnie + opcjonalnie nazwy przez AI)
+        reconcile = None
+        if self.reconcile_step5.get():
+            reconcile = lambda groups: self.reconcile_category_names(model_id, groups)
+        categories = merge_branches([optimized[index] for index in range(total)], reconcile=reconcile)
+        self.log(f"Połączono {total} gałęzi: {len(categories)} kategorii głównych")
+        return {"categories": categories}
 
     # ============ UTILITY METHODS ============
 
-    def clean_content(self, text):
-        """Czyszczenie treści markdown"""
-        text = re.sub(r'^#+\s', '', text, flags=re.MULTILINE)
-        text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
-        text = re.sub(r'\*([^*]+)\*', r'\1', text)
-        text = re.sub(r'__([^_]+)__', r'\1', text)
-        text = re.sub(r'_([^_]+)_', r'\1', text)
-        text = re.sub(r'\[([^\]]+)\]\(([^\)]+)\)', r'\1', text)
-        text = re.sub(r'https?://[^\s]+', '', text)
-        text = re.sub(r'```[\s\S]*?```', '', text)
-        text = re.sub(r'`([^`]+)`', r'\1', text)
-        text = re.sub(r'^\s*[-*]\s', '', text, flags=re.MULTILINE)
-        text = re.sub(r'^\s*\d+\.\s', '', text, flags=re.MULTILINE)
-        text = re.sub(r'\n\s*\n', '\n', text)
-        return text.strip()
-
-    def clean_field(self, content):
-        """Czyszczenie odpowiedzi AI z markdown code blocks"""
-        if not content or not isinstance(content, str):
-            return content
-        content = re.sub(r'^```(\w+)?\s*\n', '', content, flags=re.MULTILINE)
-        content = re.sub(r'\n```$', '', content, flags=re.MULTILINE)
-        return content.strip()
+    def create_rate_limiter(self, requests_per_second, num_threads):
+        """Utwórz limiter zapytań dla kroku według ustawień z zakładki Ustawienia"""
+        return RateLimiter(
+            requests_per_second=requests_per_second,
+            initial_concurrency=num_threads,
+            max_concurrency=max(num_threads, self.max_concurrency.get()),
+            adaptive=self.adaptive_concurrency.get()
+        )
+
+    def stream_json_completion(self, model_id, messages, max_tokens, use_cache=True, item_key="", on_item=None,
+                               response_format=None):
+        """
+        Zapytanie ze strumieniowaniem i przyrostowym parsowaniem odpowiedzi JSON
+
+        Niezgodny nawias, tekst zamiast JSON lub niepoprawny element przerywa
+        odbiór od razu (JsonStreamError), zamiast czekać na całą odpowiedź.
+
+        Args:
+            item_key: Klucz tablicy, której elementy trafiają do on_item po domknięciu
+            on_item: Callback dla kolejnych elementów
+
+        Returns:
+            Zdekodowany obiekt JSON
+        """
+        parser = JsonStreamParser(item_keys=(item_key,) if item_key else (), roots='{')
+
+        def on_text(text):
+            if not self.processing:
+                raise InterruptedError("Przerwano przez użytkownika")
+            for item in parser.feed(text):
+                if on_item:
+                    on_item(item)
+
+        response = self.openrouter_client.chat_completion_stream(
+            model_id, messages, max_tokens=max_tokens, use_cache=use_cache, on_text=on_text,
+            response_format=response_format
+        )
+        finish_reason = self.openrouter_client.get_finish_reason(response)
+        if not parser.complete:
+            if finish_reason == 'length':
+                raise JsonStreamError(f"Odpowiedź obcięta na limicie max_tokens ({max_tokens})")
+            if finish_reason != 'stop':
+                # Strumień zakończony bez zdarzenia końcowego (zerwane połączenie) -
+                # naprawa urwanego JSON zgubiłaby kategorie
+                raise JsonStreamError("Niekompletny JSON - strumień przerwany przed końcem odpowiedzi")
+        # Cały tekst przez parser z naprawą (np. przecinki przed nawiasem, tekst wokół JSON)
+        return self.json_parser.loads(self.openrouter_client.get_response_text(response))
+
+    def attach_response_cache(self):
+        """Podłącz cache odpowiedzi AI do klienta OpenRouter według ustawień"""
+        if not self.use_response_cache.get():
+            self.openrouter_client.response_cache = None
+            return
+        if self.response_cache is None:
+            self.response_cache = ResponseCache(max_size_mb=self.response_cache_max_mb.get())
+        self.response_cache.max_bytes = self.response_cache_max_mb.get() * 1024 * 1024
+        self.response_cache.reset_stats()
+        self.openrouter_client.response_cache = self.response_cache
+
+    def log_response_cache(self):
+        """Wyświetl w logach statystyki cache odpowiedzi AI"""
+        cache = self.openrouter_client.response_cache
+        if cache is not None:
+            stats = cache.stats()
+            self.log(f"Cache odpowiedzi AI: {stats['hits']} z cache, {stats['misses']} zapytań "
+                     f"({stats['entries']} odpowiedzi, {stats['size_mb']} MB)")
+
+    def log_json_repair(self):
+        """Wyświetl w logach liczbę odpowiedzi JSON naprawionych lokalnie"""
+        stats = self.json_parser.stats()
+        if stats['repaired'] or stats['failed']:
+            self.log(f"Naprawa JSON: {stats['repaired']} odpowiedzi naprawionych lokalnie "
+                     f"(zaoszczędzone zapytania), {stats['failed']} wymagało ponowienia")
+
+    def log_rate_limiter(self, rate_limiter):
+        """Wyświetl w logach wyuczony limit współbieżności (tryb AIMD)"""
+        if rate_limiter.current_limit is not None:
+            self.log(f"ℹ️ Adaptacyjny limit współbieżności: {rate_limiter.current_limit}")
 
     def display_structure(self, cats, level=0):
         """Wyświetl strukturę kategorii w logach"""
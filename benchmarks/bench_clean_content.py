@@ -0,0 +1,111 @@
+"""
+Micro-benchmark czyszczenia treści: poprzednia implementacja (13 x re.sub)
+vs utils.text_cleaning.clean_content
+
+Uruchomienie (z katalogu głównego repozytorium):
+    python -m benchmarks.bench_clean_content [liczba_stron]
+"""
+import os
+import random
+import re
+import sys
+import time
+
+from utils.text_cleaning import clean_content, clean_field, iter_cleaned
+
+
+def legacy_clean_content(text):
+    """Poprzednia implementacja z NexusNavigationApp.clean_content"""
+    text = re.sub(r'^#+\s', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
+    text = re.sub(r'\*([^*]+)\*', r'\1', text)
+    text = re.sub(r'__([^_]+)__', r'\1', text)
+    text = re.sub(r'_([^_]+)_', r'\1', text)
+    text = re.sub(r'\[([^\]]+)\]\(([^\)]+)\)', r'\1', text)
+    text = re.sub(r'https?://[^\s]+', '', text)
+    text = re.sub(r'```[\s\S]*?```', '', text)
+    text = re.sub(r'`([^`]+)`', r'\1', text)
+    text = re.sub(r'^\s*[-*]\s', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*\d+\.\s', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\n\s*\n', '\n', text)
+    return text.strip()
+
+
+def legacy_clean_field(content):
+    """Poprzednia implementacja z NexusNavigationApp.clean_field"""
+    if not content or not isinstance(content, str):
+        return content
+    content = re.sub(r'^```(\w+)?\s*\n', '', content, flags=re.MULTILINE)
+    content = re.sub(r'\n```$', '', content, flags=re.MULTILINE)
+    return content.strip()
+
+
+def make_page(rng):
+    """Syntetyczna strona produktu w markdown (jak z Jina Reader)"""
+    lines = [
+        "Title: Wiertarka udarowa XYZ-500",
+        "URL Source: https://sklep.example.pl/produkt/wiertarka-xyz-500.html",
+        "",
+        "Markdown Content:",
+        "# Wiertarka udarowa XYZ-500",
+        "",
+    ]
+    for i in range(rng.randint(20, 60)):
+        lines.append(f"* [Kategoria {i}](https://sklep.example.pl/kategoria/{i})")
+    lines.append("")
+    for i in range(rng.randint(40, 120)):
+        lines.append(f"Opis produktu linia {i}: moc **{rng.randint(100, 2000)} W**, "
+                     f"waga _{rng.randint(1, 9)} kg_, kod `X{i}`.")
+    lines += ["", "| Parametr | Wartość |", "|---|---|"]
+    for i in range(rng.randint(5, 25)):
+        lines.append(f"| Parametr {i} | {rng.randint(1, 500)} mm |")
+    lines += ["", "1. Pierwszy krok", "2. Drugi krok", "", "© 2025 Sklep"]
+    return "\n".join(lines)
+
+
+def make_fuzz(rng):
+    """Losowy tekst ze znakami specjalnymi markdown (test zgodności wyników)"""
+    alphabet = "ab #*_-`[]().\n\n  1http://x"
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 300)))
+
+
+def bench(func, pages, repeat=3):
+    """Najlepszy czas z `repeat` przebiegów"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            func(page)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = random.Random(42)
+    pages = [make_page(rng) for _ in range(count)]
+
+    # Zgodność wyników
+    for text in pages[:200] + [make_fuzz(rng) for _ in range(20000)]:
+        assert clean_content(text) == legacy_clean_content(text), repr(text)
+        fenced = f"```json\n{text}\n```"
+        assert clean_field(fenced) == legacy_clean_field(fenced), repr(fenced)
+    print("Wyniki identyczne z poprzednią implementacją")
+
+    legacy = bench(legacy_clean_content, pages)
+    current = bench(clean_content, pages)
+    print(f"{count} stron: poprzednio {legacy:.3f} s, teraz {current:.3f} s "
+          f"(x{legacy / current:.2f})")
+
+    # Pula procesów bez progu rozmiaru (min_pool_chars=0) - sprawdza, czy się opłaca
+    records = [{"url": str(i), "content": page} for i, page in enumerate(pages)]
+    print(f"Rdzenie: {os.cpu_count()}")
+    for processes in (0, 4):
+        start = time.perf_counter()
+        for _ in iter_cleaned(records, processes=processes, min_pool_chars=0):
+            pass
+        print(f"iter_cleaned(processes={processes}): {time.perf_counter() - start:.3f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+from utils.boilerplate import BoilerplateStripper
+
+
+def page(number):
+    return (
+        "[Home](/) | [Kontakt](/kontakt) | [Koszyk](/koszyk)\n"
+        "[Home](/) / [Wiertarki](/wiertarki)\n"
+        f"# Produkt {number}\n"
+        "**Marka:** Bosch\n"
+        "Gwarancja: 24 miesiące\n"
+        "- Zasilanie: sieciowe\n"
+        "| Parametr | Wartość |\n"
+        "|---|---|\n"
+        f"| Moc | {500 + number} W |\n"
+        f"Opis produktu numer {number}.\n"
+        "Ta strona używa plików cookie. Korzystając ze sklepu akceptujesz politykę prywatności i regulamin serwisu.\n"
+        "Ta strona używa cookies. Więcej: polityka prywatności\n"
+        "\n"
+        "Telefon: +48 123 456 789\n"
+        "E-mail: sklep@example.pl\n"
+        "\n"
+        "**Godziny otwarcia:** pn-pt 8-16\n"
+    )
+
+
+def test_dominant_parameters_and_breadcrumbs_are_kept():
+    stripper = BoilerplateStripper(threshold=0.6, warmup=5)
+    records = []
+    for number in range(10):
+        records.extend(stripper.feed({"url": f"https://sklep.pl/p/{number}", "content": page(number)}))
+    records.extend(stripper.flush())
+
+    assert len(records) == 10
+    for record in records:
+        content = record["content"]
+        assert "**Marka:** Bosch" in content
+        assert "Gwarancja: 24 miesiące" in content
+        assert "- Zasilanie: sieciowe" in content
+        assert "[Home](/) / [Wiertarki](/wiertarki)" in content
+        assert "| Parametr | Wartość |" in content
+        assert "[Kontakt](/kontakt)" not in content
+        assert "plików cookie" not in content
+
+
+def test_footer_contact_lines_are_removed():
+    stripper = BoilerplateStripper(threshold=0.6, warmup=5)
+    records = []
+    for number in range(10):
+        records.extend(stripper.feed({"url": f"https://sklep.pl/p/{number}", "content": page(number)}))
+
+    for record in records:
+        content = record["content"]
+        assert "Telefon:" not in content
+        assert "E-mail:" not in content
+        assert "Godziny otwarcia" not in content
+        assert "Więcej:" not in content
@@ -0,0 +1,30 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.bounded_executor import iter_bounded
+
+
+def test_results_in_flight_are_kept_after_stop():
+    stopped = threading.Event()
+    started = []
+
+    def work(item):
+        started.append(item)
+        if item == 0:
+            stopped.set()
+        return item
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(iter_bounded(executor, work, range(100), 4,
+                                    stop_flag_callback=lambda: not stopped.is_set()))
+
+    assert 0 in results
+    assert sorted(results) == sorted(started)
+    assert len(results) < 100
+
+
+def test_all_results_without_stop():
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(iter_bounded(executor, lambda x: x * 2, range(50), 5))
+
+    assert sorted(results) == [x * 2 for x in range(50)]
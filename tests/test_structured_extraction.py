@@ -0,0 +1,63 @@
+from utils.structured_extraction import extract_breadcrumbs, extract_structured
+
+
+NAV = ("[Home](https://sklep.pl/) | [Kontakt](https://sklep.pl/kontakt) | "
+       "[Regulamin](https://sklep.pl/regulamin) | [Koszyk](https://sklep.pl/koszyk)")
+
+SPEC_TABLE = """| Parametr | Wartość |
+|---|---|
+| Moc | 800 W |
+| Napięcie | 230 V |
+| Waga | 2,1 kg |"""
+
+URL = "https://sklep.pl/p/wiertarka-bosch-psb"
+
+
+def test_nav_bar_is_not_breadcrumbs():
+    content = f"Title: Wiertarka Bosch PSB\n\n{NAV}\n\n| Dostawa | 24h |\n\nOpis produktu."
+
+    assert extract_breadcrumbs(content, URL) == []
+    assert extract_structured(content, URL) is None
+
+
+def test_breadcrumbs_below_nav_bar():
+    content = (
+        f"Title: Wiertarka Bosch PSB\n\n{NAV}\n\n"
+        "[Strona główna](https://sklep.pl/) / [Elektronarzędzia](https://sklep.pl/elektronarzedzia) / "
+        "[Wiertarki](https://sklep.pl/elektronarzedzia/wiertarki) / Wiertarka Bosch PSB\n\n"
+        f"{SPEC_TABLE}\n"
+    )
+
+    result = extract_structured(content, URL)
+
+    assert result["product_category"] == {"main_category": "Elektronarzędzia", "subcategories": ["Wiertarki"]}
+    assert [p["parameter_name"] for p in result["product_parameters"]] == ["Moc", "Napięcie", "Waga"]
+
+
+def test_sibling_links_with_slash_are_not_breadcrumbs():
+    content = "[Home](/) / [Promocje](/promocje) / [Nowości](/nowosci)\n"
+
+    assert extract_breadcrumbs(content) == []
+
+
+def test_numbered_list_breadcrumbs():
+    content = (
+        "Title: Wiertarka Bosch PSB\n\n"
+        "1. [Home](https://sklep.pl/)\n"
+        "2. [Elektronarzędzia](https://sklep.pl/elektronarzedzia)\n"
+        "3. [Wiertarki](https://sklep.pl/elektronarzedzia/wiertarki)\n"
+        "4. Wiertarka Bosch PSB\n\n"
+        "Opis produktu.\n"
+    )
+
+    assert extract_breadcrumbs(content, URL) == ["Elektronarzędzia", "Wiertarki"]
+
+
+def test_few_parameters_go_to_model():
+    content = (
+        "[Home](/) > [Wiertarki](/wiertarki) > Wiertarka\n\n"
+        "| Moc | 800 W |\n|---|---|\n\n**Marka:** Bosch\n**Kolor:** zielony\n"
+    )
+
+    assert extract_breadcrumbs(content) == ["Wiertarki"]
+    assert extract_structured(content) is None
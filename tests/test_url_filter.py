@@ -0,0 +1,45 @@
+import pytest
+
+from utils.url_filter import UrlFilter
+
+
+def test_global_flag_in_rule():
+    url_filter = UrlFilter.parse("re:(?i)/PRODUKT/ .html")
+
+    assert url_filter.matches("https://sklep.pl/produkt/1")
+    assert url_filter.matches("https://sklep.pl/o-nas.html")
+    assert not url_filter.matches("https://sklep.pl/kategoria/1")
+
+
+def test_global_flag_applies_only_to_its_rule():
+    url_filter = UrlFilter.parse("re:(?i)/PRODUKT/ re:/Kategoria/")
+
+    assert url_filter.matches("https://sklep.pl/produkt/1")
+    assert not url_filter.matches("https://sklep.pl/kategoria/1")
+
+
+def test_verbose_flag_with_comment():
+    url_filter = UrlFilter.parse("!re:(?x)/blog/#wpisy .html")
+
+    assert url_filter.matches("https://sklep.pl/p/1.html")
+    assert not url_filter.matches("https://sklep.pl/blog/1.html")
+
+
+def test_numbered_backreference_after_rule_with_group():
+    url_filter = UrlFilter.parse(r"re:/(p)/\d+ re:/(\w+)/\1/")
+
+    assert url_filter.matches("https://sklep.pl/p/12")
+    assert url_filter.matches("https://sklep.pl/ab/ab/x")
+    assert not url_filter.matches("https://sklep.pl/ab/cd/x")
+
+
+def test_repeated_group_name_in_rules():
+    url_filter = UrlFilter.parse("re:/(?P<id>\\d+)$ re:/p-(?P<id>\\d+)")
+
+    assert url_filter.matches("https://sklep.pl/123")
+    assert url_filter.matches("https://sklep.pl/p-5.html")
+
+
+def test_invalid_rule_reports_rule():
+    with pytest.raises(ValueError, match=r"re:/\(p/"):
+        UrlFilter.parse("re:/(p/ .html")
@@ -6,6 +6,11 @@ from .prompt_manager import PromptManager
 from .openrouter_client import OpenRouterClient
 from .jina_client import JinaClient
 from .sitemap_parser import SitemapParser
+from .sitemap_cache import SitemapCache
+from .url_filter import UrlFilter
+from .page_cache import PageCache
+from .response_cache import ResponseCache
+from .rate_limiter import RateLimiter
 from .custom_widgets import ScrollableFrame, ModernScrollbar, create_modern_checkbox_style
 
 __all__ = [
@@ -14,6 +19,11 @@ __all__ = [
     'OpenRouterClient',
     'JinaClient',
     'SitemapParser',
+    'SitemapCache',
+    'UrlFilter',
+    'PageCache',
+    'ResponseCache',
+    'RateLimiter',
     'ScrollableFrame',
     'ModernScrollbar',
     'create_modern_checkbox_style'
@@ -0,0 +1,57 @@
+"""
+Batch Extraction - ekstrakcja kilku produktów w jednym zapytaniu do LLM (krok 3)
+"""
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+# Instrukcja dołączana do treści produktów - prompt systemowy kroku 3 opisuje
+# format ekstrakcji pojedynczego produktu, tu prosimy o tablicę z identyfikatorami
+BATCH_INSTRUCTION = (
+    "Below are several product pages, each introduced by a line '=== PRODUCT <id> ==='.\n"
+    "Apply the instructions to EACH product separately.\n"
+    "Return ONLY a JSON array with exactly one element per product, in this form:\n"
+    '[{"id": "<id>", "extraction": <JSON object for this product in the format described above>}]\n'
+    "Do not merge products and do not skip any product."
+)
+
+
+def build_batch_message(products: Iterable[Tuple[str, str]]) -> str:
+    """
+    Zbuduj treść wiadomości użytkownika dla paczki produktów
+
+    Args:
+        products: Pary (identyfikator, oczyszczona treść strony)
+    """
+    parts = [BATCH_INSTRUCTION]
+    for product_id, content in products:
+        parts.append(f"=== PRODUCT {product_id} ===\n{content}")
+    return "\n\n".join(parts)
+
+
+def parse_batch_response(data: Any, ids: List[str]) -> Dict[str, Dict]:
+    """
+    Przypisz wyniki z odpowiedzi modelu do identyfikatorów produktów
+
+    Akceptuje tablicę [{"id", "extraction"}] oraz obiekt {id: extraction}.
+    Pominięte lub puste wyniki nie trafiają do słownika - wywołujący
+    ponawia je pojedynczo.
+
+    Returns:
+        Słownik identyfikator -> ekstrakcja
+    """
+    expected = set(ids)
+    if isinstance(data, dict):
+        pairs = data.items()
+    elif isinstance(data, list):
+        pairs = (
+            (str(item.get("id")), item.get("extraction"))
+            for item in data if isinstance(item, dict)
+        )
+    else:
+        return {}
+
+    return {
+        product_id: extraction
+        for product_id, extraction in pairs
+        if product_id in expected and isinstance(extraction, dict) and extraction
+    }
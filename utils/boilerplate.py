@@ -0,0 +1,182 @@
+"""
+Boilerplate - usuwanie powtarzalnych elementów stron (menu, stopki, banery cookie)
+"""
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+
+# Trzy i więcej pustych linii po usunięciu bloków
+_BLANK_RUNS = re.compile(r'\n{3,}')
+
+# Wiersze tabel i okruszki - powtarzają się na kartach produktu (nagłówki tabel
+# parametrów, ścieżka dominującej kategorii), a są potrzebne w kroku 3
+_PROTECTED_LINES = re.compile(
+    r'^(?:'
+    r'\|'                                                       # wiersz tabeli
+    r'|\d+\.\s+!?\['                                            # okruszki jako lista numerowana
+    r'|!?\[[^\]]*\]\([^)]*\)\s*(?:/|>|»|›|→)\s*!?\['            # okruszki: [Home](/) / [Kategoria](...)
+    r')'
+)
+
+# Linie parametrów: '**Nazwa:** wartość' i 'Nazwa: wartość' (też w liście) z krótką
+# etykietą bez znaków zdania; nagłówek odpowiedzi Jina (Title:, URL Source:) pomijany
+_SPEC_LINES = re.compile(
+    r'^(?:[-*+]\s+)?(?:'
+    r'\*\*[^*.,!?;\n]{1,40}?\*\*:?\s*\S'
+    r'|(?!(?:Title|URL Source|Markdown Content|Published Time):)[^\s:|*#\[][^:|.,!?;\n]{0,39}:\s+[^\n]{1,80}$'
+    r')'
+)
+
+
+class _DomainStats:
+    """Częstość występowania linii na stronach jednej domeny"""
+
+    def __init__(self):
+        self.pages = 0
+        self.line_counts: Dict[str, int] = defaultdict(int)
+        self.buffer: List[Dict] = []
+
+
+class BoilerplateStripper:
+    """
+    Usuwanie linii powtarzających się na wielu stronach tej samej domeny
+
+    Dla każdej domeny liczy, na ilu stronach występuje dana linia. Linia
+    obecna na co najmniej `threshold` stron jest traktowana jako element
+    szablonu sklepu (menu, stopka, baner cookie) i usuwana - całe bloki
+    szablonu znikają w ten sposób linia po linii. Pierwsze `warmup` stron
+    domeny jest buforowanych, dopóki statystyki nie są wiarygodne.
+
+    Wiersze tabel i okruszki nie są usuwane - dominująca kategoria powtarza
+    się na większości kart produktu, a jest potrzebna w krokach 3 i 4. Linie
+    parametrów ('**Marka:** Bosch', 'Gwarancja: 24 miesiące') zostają, jeśli
+    ich blok (kolejne linie parametrów i wierszy tabel) zawiera choć jedną
+    linię właściwą dla produktu - blok złożony wyłącznie z powtarzalnych
+    linii (np. 'Telefon: ...', 'E-mail: ...' w stopce) jest usuwany.
+    """
+
+    def __init__(self, threshold: Optional[float] = 0.6, warmup: int = 20, max_length: int = 0,
+                 prune_every: int = 500, prune_ratio: float = 0.02):
+        """
+        Args:
+            threshold: Udział stron domeny, od którego linia jest uznawana za szablon
+                (None = tylko przycinanie do max_length)
+            warmup: Liczba stron domeny zbieranych przed rozpoczęciem usuwania
+            max_length: Maksymalna długość treści w znakach (0 = bez limitu)
+            prune_every: Co ile stron domeny usuwać rzadkie linie ze statystyk
+            prune_ratio: Linie obecne na mniejszym udziale stron są zapominane
+        """
+        self.threshold = threshold
+        self.warmup = max(1, warmup)
+        self.max_length = max_length
+        self.prune_every = prune_every
+        self.prune_ratio = prune_ratio
+        self.chars_before = 0
+        self.chars_after = 0
+        self._domains: Dict[str, _DomainStats] = defaultdict(_DomainStats)
+
+    def feed(self, record: Dict) -> List[Dict]:
+        """
+        Przekaż pobrany rekord
+
+        Returns:
+            Rekordy gotowe do zapisu (pusta lista, gdy rekord czeka w buforze)
+        """
+        if not record.get("content") or "error" in record:
+            return [record]
+        if self.threshold is None:
+            return [self._strip(None, record)]
+
+        stats = self._domains[urlsplit(record["url"]).hostname or ""]
+        self._count(stats, record["content"])
+
+        if stats.pages < self.warmup:
+            stats.buffer.append(record)
+            return []
+
+        ready = stats.buffer + [record]
+        stats.buffer = []
+        return [self._strip(stats, item) for item in ready]
+
+    def flush(self) -> List[Dict]:
+        """Zwróć rekordy z buforów domen, które nie osiągnęły progu rozgrzewki"""
+        ready = []
+        for stats in self._domains.values():
+            ready.extend(self._strip(stats, item) for item in stats.buffer)
+            stats.buffer = []
+        return ready
+
+    def _count(self, stats: _DomainStats, content: str):
+        """Zlicz linie strony (każda linia raz na stronę)"""
+        stats.pages += 1
+        for line in {line.strip() for line in content.splitlines()}:
+            if line:
+                stats.line_counts[line] += 1
+
+        # Rzadkie linie (treść produktów) nie mogą już przekroczyć progu - ograniczenie pamięci
+        if self.prune_every and stats.pages % self.prune_every == 0:
+            minimum = stats.pages * self.prune_ratio
+            stats.line_counts = defaultdict(int, {
+                line: count for line, count in stats.line_counts.items() if count >= minimum
+            })
+
+    def _strip(self, stats: Optional[_DomainStats], record: Dict) -> Dict:
+        """Usuń linie szablonu i przytnij treść"""
+        content = record["content"]
+        self.chars_before += len(content)
+
+        if stats is not None and stats.pages >= self.warmup:
+            minimum = stats.pages * self.threshold
+            lines = content.splitlines()
+            in_spec_block = self._spec_blocks(stats, lines, minimum)
+            kept = []
+            for line, in_spec in zip(lines, in_spec_block):
+                stripped = line.strip()
+                if (stripped and stats.line_counts.get(stripped, 0) >= minimum
+                        and not _PROTECTED_LINES.match(stripped) and not in_spec):
+                    continue
+                kept.append(line)
+            # Strona złożona wyłącznie z szablonu - zostaw oryginał
+            content = _BLANK_RUNS.sub('\n\n', '\n'.join(kept)).strip() or content
+
+        if self.max_length and len(content) > self.max_length:
+            cut = content.rfind('\n', 0, self.max_length)
+            content = content[:cut if cut > 0 else self.max_length]
+
+        self.chars_after += len(content)
+        return {**record, "content": content}
+
+    @staticmethod
+    def _spec_blocks(stats: _DomainStats, lines: List[str], minimum: float) -> List[bool]:
+        """
+        Czy linia parametru leży w bloku z danymi produktu
+
+        Blok to kolejne linie parametrów i wiersze tabel (puste linie go nie
+        przerywają); liczy się jako dane produktu, gdy co najmniej jedna jego
+        linia występuje na mniej niż `minimum` stron domeny.
+        """
+        result = [False] * len(lines)
+        block: List[int] = []
+        specific = False
+        for index, line in enumerate(lines + ['.']):
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if stripped.startswith('|') or _SPEC_LINES.match(stripped):
+                block.append(index)
+                specific = specific or stats.line_counts.get(stripped, 0) < minimum
+                continue
+            if specific:
+                for position in block:
+                    result[position] = True
+            block, specific = [], False
+        return result
+
+    @property
+    def saved_ratio(self) -> float:
+        """Udział usuniętych znaków"""
+        if not self.chars_before:
+            return 0.0
+        return 1 - self.chars_after / self.chars_before
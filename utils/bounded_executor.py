@@ -0,0 +1,59 @@
+"""
+Bounded Executor - przetwarzanie w puli wątków z ograniczonym oknem zadań
+"""
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from typing import Callable, Iterable, Iterator, Optional
+
+
+def iter_bounded(
+    executor: Executor,
+    func: Callable,
+    items: Iterable,
+    max_in_flight: int,
+    stop_flag_callback: Optional[Callable[[], bool]] = None
+) -> Iterator:
+    """
+    Wykonuj func dla kolejnych elementów i zwracaj wyniki w kolejności ukończenia
+
+    W danej chwili istnieje najwyżej max_in_flight zadań (producent/konsument),
+    więc pamięć zależy od współbieżności, a nie od liczby elementów. Po
+    sygnale stop nie są zlecane nowe zadania, niezaczęte są anulowane, a
+    pętla kończy się po ukończeniu zadań w toku - ich wyniki (np. pobrane
+    i opłacone strony) są nadal zwracane.
+
+    Args:
+        executor: Pula wątków wykonująca zadania
+        func: Funkcja wywoływana dla każdego elementu
+        items: Elementy (może być generator - pobierany leniwie)
+        max_in_flight: Maksymalna liczba zadań zleconych naraz
+        stop_flag_callback: Callback zwracający False gdy należy przerwać
+    """
+    def should_stop() -> bool:
+        return bool(stop_flag_callback) and not stop_flag_callback()
+
+    remaining = iter(items)
+    pending = set()
+    exhausted = False
+
+    try:
+        while True:
+            while not exhausted and len(pending) < max_in_flight and not should_stop():
+                try:
+                    item = next(remaining)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(func, item))
+
+            if not pending:
+                return
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+            if should_stop():
+                # Anulowanie udaje się tylko dla zadań, które jeszcze nie ruszyły
+                pending = {future for future in pending if not future.cancel()}
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,416 @@
+"""
+Corpus - zapis i odczyt treści stron z kroku 2
+
+Format podstawowy (content_website.jsonl.gz): każdy rekord JSON to osobny
+człon gzip dopisywany na koniec pliku, a plik .idx obok przechowuje dla
+każdego rekordu (klucz URL, offset, długość, sukces). Całość jest poprawnym
+strumieniem gzip z JSONL, a indeks pozwala czytać pojedyncze rekordy bez
+rozpakowywania reszty. Starsze formaty (JSONL, JSON) są nadal czytane.
+"""
+import gzip
+import hashlib
+import json
+import os
+import struct
+import sys
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .url_filter import url_key
+
+
+# Pliki korpusu w kolejności preferencji (JSONL i JSON to formaty starszych projektów)
+CORPUS_GZ = "content_website.jsonl.gz"
+CORPUS_JSONL = "content_website.jsonl"
+CORPUS_JSON = "content_website.json"
+CORPUS_FILES = [CORPUS_GZ, CORPUS_JSONL, CORPUS_JSON]
+
+# Wpis indeksu: klucz URL (url_key), offset członu, długość członu, czy sukces
+_INDEX_ENTRY = struct.Struct('<QQI?')
+
+# Poziom kompresji członów (kompromis szybkość / rozmiar)
+COMPRESS_LEVEL = 6
+
+
+def index_path(path) -> Path:
+    """Ścieżka indeksu offsetów dla skompresowanego korpusu"""
+    path = Path(path)
+    return path.with_name(path.name + '.idx')
+
+
+def is_compressed(path) -> bool:
+    """Czy plik korpusu jest w formacie skompresowanym (.jsonl.gz)"""
+    return Path(path).suffix == '.gz'
+
+
+def resolve_corpus_path(project_path) -> Optional[Path]:
+    """Znajdź plik korpusu w folderze projektu (None gdy brak)"""
+    if not project_path:
+        return None
+    for filename in CORPUS_FILES:
+        path = Path(project_path) / filename
+        if path.exists():
+            return path
+    return None
+
+
+def is_success(record: Dict) -> bool:
+    """Czy rekord zawiera poprawnie pobraną treść"""
+    return bool(record.get("content")) and "error" not in record
+
+
+def _pack_member(record: Dict) -> bytes:
+    """Skompresuj rekord do osobnego członu gzip (jedna linia JSONL)"""
+    line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+    return gzip.compress(line, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def _unpack_member(member: bytes) -> Dict:
+    """Rozpakuj człon gzip do rekordu"""
+    return json.loads(zlib.decompress(member, 31))
+
+
+def _scan_members(path) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Przejdź po członach gzip pliku bez indeksu
+
+    Niedokończony ostatni człon (przerwany zapis) jest pomijany.
+
+    Yields:
+        Krotki (offset, długość członu, rozpakowana treść)
+    """
+    with open(path, 'rb') as f:
+        offset = 0
+        pending = b''
+        while True:
+            decompressor = zlib.decompressobj(31)
+            output = []
+            consumed = 0
+            data = pending
+            while True:
+                if not data:
+                    data = f.read(65536)
+                    if not data:
+                        return
+                output.append(decompressor.decompress(data))
+                if decompressor.eof:
+                    pending = decompressor.unused_data
+                    consumed += len(data) - len(pending)
+                    break
+                consumed += len(data)
+                data = b''
+            yield offset, consumed, b''.join(output)
+            offset += consumed
+
+
+def read_index(path) -> List[Tuple[int, int, int, bool]]:
+    """
+    Wczytaj indeks skompresowanego korpusu (odbudowuje go, gdy brak)
+
+    Returns:
+        Lista wpisów (klucz URL, offset, długość, sukces) w kolejności zapisu
+    """
+    idx_path = index_path(path)
+    if not idx_path.exists():
+        rebuild_index(path)
+    with open(idx_path, 'rb') as f:
+        data = f.read()
+    usable = len(data) - len(data) % _INDEX_ENTRY.size
+    return list(_INDEX_ENTRY.iter_unpack(data[:usable]))
+
+
+def rebuild_index(path) -> int:
+    """Odbuduj indeks skanując człony gzip; zwraca liczbę rekordów"""
+    count = 0
+    tmp_path = index_path(path).with_name(index_path(path).name + '.tmp')
+    with open(tmp_path, 'wb') as idx:
+        for offset, length, raw in _scan_members(path):
+            try:
+                record = json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+            idx.write(_INDEX_ENTRY.pack(url_key(record["url"]), offset, length, is_success(record)))
+            count += 1
+    os.replace(tmp_path, index_path(path))
+    return count
+
+
+def content_fingerprint(content: str, context: str = "") -> str:
+    """
+    Odcisk treści strony do wykrywania zmian między uruchomieniami
+
+    Args:
+        content: Treść strony
+        context: Dodatkowe dane wpływające na wynik przetwarzania (np. model i prompt)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(context.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(content.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CorpusWriter:
+    """
+    Append-only zapis wyników kroku 2
+
+    Dla .jsonl.gz każdy rekord to osobny człon gzip z wpisem w indeksie, dla
+    .jsonl - jedna linia JSON. Każdy rekord jest zapisywany i flushowany od
+    razu po pobraniu, więc przerwanie (Stop, crash) traci co najwyżej rekordy
+    w locie.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.compressed = is_compressed(self.path)
+        self.written = 0
+        self._index = None
+        if self.compressed:
+            self._repair_compressed()
+            self._file = open(self.path, 'ab')
+            self._offset = self.path.stat().st_size
+            self._index = open(index_path(self.path), 'ab')
+        else:
+            self._repair_tail()
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _repair_compressed(self):
+        """Uzgodnij plik danych z indeksem po przerwanym zapisie"""
+        idx_path = index_path(self.path)
+        if not self.path.exists():
+            if idx_path.exists():
+                idx_path.unlink()
+            return
+        if not idx_path.exists():
+            rebuild_index(self.path)
+
+        # Dane są zapisywane przed wpisem indeksu - obetnij wszystko za ostatnim
+        # zaindeksowanym członem (i wpisy wskazujące poza plik)
+        entries = read_index(self.path)
+        data_size = self.path.stat().st_size
+        while entries and entries[-1][1] + entries[-1][2] > data_size:
+            entries.pop()
+        end = entries[-1][1] + entries[-1][2] if entries else 0
+
+        with open(idx_path, 'rb+') as f:
+            f.truncate(len(entries) * _INDEX_ENTRY.size)
+        if data_size > end:
+            with open(self.path, 'rb+') as f:
+                f.truncate(end)
+
+    def _repair_tail(self):
+        """Obetnij niedokończoną ostatnią linię po przerwanym zapisie"""
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b'\n':
+                return
+            # Szukaj ostatniego znaku nowej linii od końca
+            pos = f.seek(0, os.SEEK_END)
+            chunk_size = 65536
+            while pos > 0:
+                start = max(0, pos - chunk_size)
+                f.seek(start)
+                chunk = f.read(pos - start)
+                idx = chunk.rfind(b'\n')
+                if idx != -1:
+                    f.truncate(start + idx + 1)
+                    return
+                pos = start
+            f.truncate(0)
+
+    def write(self, record: Dict):
+        """Dopisz rekord"""
+        if self.compressed:
+            member = _pack_member(record)
+            self._file.write(member)
+            self._file.flush()
+            self._index.write(_INDEX_ENTRY.pack(
+                url_key(record["url"]), self._offset, len(member), is_success(record)
+            ))
+            self._index.flush()
+            self._offset += len(member)
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+        self.written += 1
+
+    def close(self):
+        """Zamknij plik"""
+        self._file.close()
+        if self._index:
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_corpus(path) -> Iterator[Dict]:
+    """Iteruj po rekordach korpusu (.jsonl.gz i JSONL strumieniowo, legacy JSON w całości)"""
+    path = Path(path)
+    if is_compressed(path):
+        with open(path, 'rb') as f:
+            for _, offset, length, _ in read_index(path):
+                f.seek(offset)
+                member = f.read(length)
+                if len(member) < length:
+                    # Wpis indeksu bez danych (przerwany zapis)
+                    break
+                yield _unpack_member(member)
+    elif path.suffix == '.jsonl':
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Niedokończona linia po przerwanym zapisie
+                    continue
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+
+
+def count_corpus(path) -> int:
+    """Liczba rekordów korpusu (dla .jsonl.gz z samego indeksu)"""
+    path = Path(path)
+    if is_compressed(path):
+        return len(read_index(path))
+    if path.suffix == '.jsonl':
+        with open(path, 'rb') as f:
+            return sum(1 for line in f if line.strip())
+    return sum(1 for _ in iter_corpus(path))
+
+
+def load_completed_urls(path) -> Set[int]:
+    """Klucze URL-i (url_key), które zostały już poprawnie pobrane"""
+    completed = set()
+    if not Path(path).exists():
+        return completed
+    if is_compressed(path):
+        return {key for key, _, _, ok in read_index(path) if ok}
+    for record in iter_corpus(path):
+        if is_success(record):
+            completed.add(url_key(record["url"]))
+    return completed
+
+
+def compact_corpus(path, keep_keys: Optional[Set[int]] = None) -> int:
+    """
+    Przepisz korpus JSONL zostawiając ostatni rekord dla każdego URL-a
+
+    Po wznowieniu w pliku zostają stare rekordy z błędem dla URL-i pobranych
+    później poprawnie. Opcjonalnie usuwa też URL-e spoza keep_keys (np. usunięte
+    z products.txt).
+
+    Returns:
+        Liczba rekordów po kompaktowaniu
+    """
+    path = Path(path)
+    if is_compressed(path):
+        return _compact_compressed(path, keep_keys)
+
+    last_index: Dict[int, int] = {}
+    for idx, record in enumerate(iter_corpus(path)):
+        key = url_key(record["url"])
+        if keep_keys is None or key in keep_keys:
+            last_index[key] = idx
+
+    tmp_path = path.with_name(path.name + '.tmp')
+    kept = 0
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for idx, record in enumerate(iter_corpus(path)):
+            if last_index.get(url_key(record["url"])) == idx:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                kept += 1
+    os.replace(tmp_path, path)
+    return kept
+
+
+def _compact_compressed(path: Path, keep_keys: Optional[Set[int]]) -> int:
+    """Kompaktowanie .jsonl.gz - człony są kopiowane bez ponownej kompresji"""
+    entries = read_index(path)
+    last_index: Dict[int, int] = {}
+    for idx, (key, _, _, _) in enumerate(entries):
+        if keep_keys is None or key in keep_keys:
+            last_index[key] = idx
+
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_index = index_path(tmp_path)
+    kept = 0
+    offset = 0
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as dst, open(tmp_index, 'wb') as idx:
+        for i, (key, old_offset, length, ok) in enumerate(entries):
+            if last_index.get(key) != i:
+                continue
+            src.seek(old_offset)
+            dst.write(src.read(length))
+            idx.write(_INDEX_ENTRY.pack(key, offset, length, ok))
+            offset += length
+            kept += 1
+
+    # Bez indeksu plik danych jest nadal czytelny (indeks zostanie odbudowany)
+    index_path(path).unlink()
+    os.replace(tmp_path, path)
+    os.replace(tmp_index, index_path(path))
+    return kept
+
+
+def convert_corpus(src_path, dst_path=None) -> int:
+    """
+    Przekonwertuj korpus ze starszego formatu (JSON / JSONL) do .jsonl.gz
+
+    Args:
+        src_path: Plik content_website.json lub content_website.jsonl
+        dst_path: Plik docelowy (domyślnie content_website.jsonl.gz obok źródła)
+
+    Returns:
+        Liczba przekonwertowanych rekordów
+    """
+    src_path = Path(src_path)
+    dst_path = Path(dst_path) if dst_path else src_path.with_name(CORPUS_GZ)
+    tmp_path = dst_path.with_name('tmp_' + dst_path.name)
+    for stale in (tmp_path, index_path(tmp_path)):
+        if stale.exists():
+            stale.unlink()
+
+    with CorpusWriter(tmp_path) as writer:
+        for record in iter_corpus(src_path):
+            writer.write(record)
+
+    os.replace(tmp_path, dst_path)
+    os.replace(index_path(tmp_path), index_path(dst_path))
+    return writer.written
+
+
+def main(argv: List[str]) -> int:
+    """Konwersja korpusów istniejących projektów: python -m utils.corpus <folder_projektu>..."""
+    if not argv:
+        print("Użycie: python -m utils.corpus <folder_projektu> [<folder_projektu> ...]")
+        return 1
+
+    for project_dir in argv:
+        src_path = resolve_corpus_path(project_dir)
+        if src_path is None:
+            print(f"{project_dir}: brak pliku korpusu")
+            continue
+        if is_compressed(src_path):
+            print(f"{project_dir}: korpus jest już w formacie {CORPUS_GZ}")
+            continue
+        count = convert_corpus(src_path)
+        before = src_path.stat().st_size
+        after = (src_path.with_name(CORPUS_GZ)).stat().st_size
+        print(f"{project_dir}: {count} rekordów, {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB "
+              f"(oryginał {src_path.name} można usunąć)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
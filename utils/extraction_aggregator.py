@@ -0,0 +1,208 @@
+"""
+Extraction Aggregator - zwarte tabele częstości z ekstrakcji produktów (przed krokiem 4)
+"""
+import re
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .token_estimator import estimate_tokens
+
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Tokeny jednego węzła odpowiedzi kroku 4 poza nazwą: {"name": "", "subcategories": []},
+# z wcięciem
+NODE_TOKENS = 16
+
+
+def _normalize(value: Any) -> str:
+    """Tekst bez nadmiarowych białych znaków"""
+    return _WHITESPACE.sub(' ', str(value)).strip()
+
+
+def _iter_parameters(parameters: Any) -> Iterator[Tuple[str, str]]:
+    """
+    Pary (nazwa, wartość) z product_parameters
+
+    Obsługuje słownik {nazwa: wartość}, dosłowny format z promptu
+    {"parameter_name", "parameter_value"} oraz listę takich obiektów.
+    """
+    if isinstance(parameters, list):
+        for item in parameters:
+            yield from _iter_parameters(item)
+        return
+    if not isinstance(parameters, dict):
+        return
+
+    if 'parameter_name' in parameters:
+        name = _normalize(parameters.get('parameter_name', ''))
+        value = parameters.get('parameter_value', '')
+        if name:
+            for single in (value if isinstance(value, list) else [value]):
+                single = _normalize(single)
+                if single:
+                    yield name, single
+        return
+
+    for name, value in parameters.items():
+        name = _normalize(name)
+        if not name or isinstance(value, dict):
+            continue
+        for single in (value if isinstance(value, list) else [value]):
+            single = _normalize(single)
+            if single:
+                yield name, single
+
+
+class _Spelling:
+    """Grupowanie bez rozróżniania wielkości liter z najczęstszą pisownią"""
+
+    def __init__(self):
+        self.counts: Dict[str, Counter] = defaultdict(Counter)
+
+    def add(self, text: str) -> str:
+        key = text.casefold()
+        self.counts[key][text] += 1
+        return key
+
+    def display(self, key: str) -> str:
+        return self.counts[key].most_common(1)[0][0]
+
+
+class ExtractionAggregator:
+    """
+    Agregacja ekstrakcji z kroku 3 do tabel częstości
+
+    Zamiast tysięcy niemal identycznych rekordów krok 4 dostaje po jednym
+    wpisie na kategorię główną: liczbę produktów, ścieżki podkategorii z
+    liczebnością oraz najczęstsze wartości parametrów. Nazwy są grupowane
+    bez rozróżniania wielkości liter (wyświetlana jest najczęstsza pisownia).
+    """
+
+    def __init__(self, top_values: int = 15, top_parameters: int = 30):
+        """
+        Args:
+            top_values: Liczba najczęstszych wartości zachowywanych dla parametru
+            top_parameters: Liczba najczęstszych parametrów na kategorię główną
+        """
+        self.top_values = top_values
+        self.top_parameters = top_parameters
+        self.products = 0
+        self._names = _Spelling()
+        self._main_counts: Counter = Counter()
+        self._paths: Dict[str, Counter] = defaultdict(Counter)
+        self._param_counts: Dict[str, Counter] = defaultdict(Counter)
+        self._param_values: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+
+    def add(self, extraction: Dict) -> bool:
+        """Dodaj ekstrakcję produktu; zwraca False, gdy brak kategorii głównej"""
+        category = extraction.get('product_category') or {}
+        main = _normalize(category.get('main_category') or '')
+        if not main:
+            return False
+
+        self.products += 1
+        main_key = self._names.add(main)
+        self._main_counts[main_key] += 1
+
+        subcategories = category.get('subcategories') or []
+        if isinstance(subcategories, str):
+            subcategories = [subcategories]
+        path = tuple(self._names.add(name) for name in map(_normalize, subcategories) if name)
+        if path:
+            self._paths[main_key][path] += 1
+
+        seen = set()
+        for name, value in _iter_parameters(extraction.get('product_parameters')):
+            name_key = self._names.add(name)
+            if name_key not in seen:
+                self._param_counts[main_key][name_key] += 1
+                seen.add(name_key)
+            self._param_values[(main_key, name_key)][self._names.add(value)] += 1
+        return True
+
+    def add_all(self, extractions: Iterable[Dict]) -> 'ExtractionAggregator':
+        """Dodaj wiele ekstrakcji"""
+        for extraction in extractions:
+            self.add(extraction)
+        return self
+
+    def groups(self) -> List[Dict]:
+        """
+        Wpisy tabeli częstości - po jednym na kategorię główną
+
+        Returns:
+            Lista {"main_category", "products", "subcategory_paths", "parameters"}
+            posortowana malejąco po liczbie produktów
+        """
+        display = self._names.display
+        result = []
+        for main_key, products in self._main_counts.most_common():
+            parameters = []
+            for name_key, count in self._param_counts[main_key].most_common(self.top_parameters):
+                values = self._param_values[(main_key, name_key)]
+                parameters.append({
+                    "name": display(name_key),
+                    "products": count,
+                    "distinct_values": len(values),
+                    "top_values": {display(v): n for v, n in values.most_common(self.top_values)}
+                })
+            result.append({
+                "main_category": display(main_key),
+                "products": products,
+                "subcategory_paths": [
+                    {"path": [display(name) for name in path], "count": count}
+                    for path, count in self._paths[main_key].most_common()
+                ],
+                "parameters": parameters
+            })
+        return result
+
+
+def navigation_tokens(group: Dict) -> int:
+    """
+    Szacowana liczba tokenów struktury nawigacji, którą model zwróci dla wpisu
+
+    Każda kategoria z ścieżek podkategorii (i sama kategoria główna) to
+    jeden węzeł odpowiedzi.
+    """
+    nodes = set()
+    for entry in group.get("subcategory_paths") or []:
+        path = entry.get("path") or []
+        nodes.update(tuple(path[:depth]) for depth in range(1, len(path) + 1))
+    names = [group.get("main_category", "")] + [node[-1] for node in nodes]
+    return sum(estimate_tokens(name) + NODE_TOKENS for name in names)
+
+
+def split_oversized(
+    groups: Iterable[Dict],
+    cost: Callable[[Dict], int],
+    budget: int,
+    output_cost: Optional[Callable[[Dict], int]] = None,
+    output_budget: int = 0
+) -> Iterator[Dict]:
+    """
+    Podziel wpisy większe niż budżet na części z podzbiorem ścieżek podkategorii
+
+    Wpis jest dzielony także wtedy, gdy odpowiedź dla niego (output_cost)
+    przekroczyłaby output_budget. Parametry trafiają tylko do pierwszej
+    części, żeby nie powtarzać ich w każdej paczce.
+    """
+    def fits(part: Dict) -> bool:
+        if cost(part) > budget:
+            return False
+        return not (output_cost and output_budget) or output_cost(part) <= output_budget
+
+    for group in groups:
+        pending = [group]
+        while pending:
+            part = pending.pop(0)
+            paths = part["subcategory_paths"]
+            if len(paths) <= 1 or fits(part):
+                yield part
+                continue
+            half = len(paths) // 2
+            pending[:0] = [
+                {**part, "subcategory_paths": paths[:half]},
+                {**part, "subcategory_paths": paths[half:], "parameters": []}
+            ]
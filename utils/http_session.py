@@ -0,0 +1,60 @@
+"""
+HTTP Session - współdzielona pula połączeń dla klientów HTTP
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def create_session(pool_size: int = 10) -> requests.Session:
+    """
+    Utwórz sesję HTTP z pulą połączeń keep-alive
+
+    Args:
+        pool_size: Maksymalna liczba równoczesnych połączeń do jednego hosta
+                   (powinna odpowiadać liczbie wątków korzystających z sesji)
+
+    Returns:
+        Sesja requests z zamontowanym adapterem puli połączeń
+    """
+    session = requests.Session()
+    mount_pool(session, pool_size)
+    return session
+
+
+def mount_pool(session: requests.Session, pool_size: int):
+    """
+    Zamontuj w sesji adapter z pulą połączeń o podanym rozmiarze
+
+    Wywoływane przed uruchomieniem wątków - zapytania w toku dokończą się na
+    poprzednim adapterze, nowe trafią już do większej puli.
+    """
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+
+class PooledSession:
+    """
+    Baza klientów API - sesja z pulą połączeń powiększaną wraz z liczbą wątków
+
+    Klient tworzy sesję z początkowym rozmiarem puli, a przed uruchomieniem
+    większej liczby wątków wywołuje ensure_pool_size.
+    """
+
+    def __init__(self, pool_size: int = 10):
+        """
+        Args:
+            pool_size: Początkowy rozmiar puli połączeń
+        """
+        self.pool_size = pool_size
+        self.session = create_session(pool_size)
+        self._pool_lock = threading.Lock()
+
+    def ensure_pool_size(self, pool_size: int):
+        """Powiększ pulę połączeń, jeśli liczba wątków wzrosła"""
+        with self._pool_lock:
+            if pool_size > self.pool_size:
+                mount_pool(self.session, pool_size)
+                self.pool_size = pool_size
@@ -1,15 +1,36 @@
 """
 Jina Reader API Client - do pobierania treści stron produktowych
 """
-import requests
-from typing import Dict, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+from typing import Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 
+from .bounded_executor import iter_bounded
+from .http_session import PooledSession
+from .page_cache import PageCache
+from .rate_limiter import RateLimiter
 
-class JinaClient:
+
+class JinaClient(PooledSession):
     """Klient do komunikacji z Jina Reader API"""
 
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        pool_size: int = 10,
+        timeout: Tuple[float, float] = (10, 120),
+        rate_limiter: Optional[RateLimiter] = None,
+        page_cache: Optional[PageCache] = None
+    ):
+        """
+        Args:
+            api_key: Klucz API Jina
+            pool_size: Rozmiar puli połączeń (liczba wątków pobierających)
+            timeout: Timeout (połączenie, odczyt) w sekundach
+            rate_limiter: Współdzielony limiter zapytań (domyślnie tylko backoff przy błędach)
+            page_cache: Cache treści stron - trafienia nie wywołują API
+        """
+        super().__init__(pool_size)
         self.api_key = api_key
         self.base_url = "https://r.jina.ai/"
         self.headers = {
@@ -19,21 +40,48 @@ class JinaClient:
             "X-Retain-Images": "none",
             "X-Return-Format": "markdown"
         }
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.page_cache = page_cache
+
+    def _cached(self, url: str) -> Optional[Dict[str, str]]:
+        """Wynik z cache stron (None gdy brak, przeterminowany lub cache wyłączony)"""
+        if self.page_cache is None:
+            return None
+        entry = self.page_cache.get(url)
+        if entry is None or not entry["content"]:
+            return None
+        return {"url": url, "content": entry["content"]}
+
+    def _store(self, url: str, content: str, etag: Optional[str]):
+        """Zapisz pobraną treść w cache stron"""
+        if self.page_cache is not None and content:
+            self.page_cache.put(url, content, etag)
 
     def fetch_url(self, url: str, max_retries: int = 3) -> Dict[str, str]:
-        """Pobierz treść pojedynczego URL"""
+        """Pobierz treść pojedynczego URL (najpierw z cache stron, jeśli ustawiony)"""
+        cached = self._cached(url)
+        if cached is not None:
+            return cached
+
         for attempt in range(max_retries + 1):
             try:
                 data = {"url": url}
-                response = requests.post(
-                    self.base_url,
-                    headers=self.headers,
-                    json=data
-                )
-                response.raise_for_status()
+                with self.rate_limiter.slot():
+                    response = self.session.post(
+                        self.base_url,
+                        headers=self.headers,
+                        json=data,
+                        timeout=self.timeout
+                    )
+                    response.raise_for_status()
+                self.rate_limiter.report_success()
+                self._store(url, response.text, response.headers.get('ETag'))
                 return {"url": url, "content": response.text}
             except Exception as e:
+                self.rate_limiter.report_error(e)
                 if attempt < max_retries:
+                    self.rate_limiter.wait_before_retry(attempt, e)
                     continue
                 else:
                     return {"url": url, "content": "", "error": str(e)}
@@ -44,34 +92,36 @@ class JinaClient:
         num_threads: int = 10,
         max_retries: int = 3,
         progress_callback=None,
-        stop_flag_callback=None
+        stop_flag_callback=None,
+        result_callback=None
     ) -> list:
-        """Pobierz treść wielu URL równolegle"""
+        """
+        Pobierz treść wielu URL równolegle
+
+        Z result_callback każdy wynik jest przekazywany do callbacku zaraz po
+        pobraniu (np. do zapisu na dysk) i nie jest gromadzony w zwracanej liście.
+        """
         results = []
         total = len(urls)
         processed = 0
 
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            futures = []
-
-            # Submit tasks and check stop flag
-            for url in urls:
-                if stop_flag_callback and not stop_flag_callback():
-                    break
-                future = executor.submit(self.fetch_url, url, max_retries)
-                futures.append(future)
-
-            # Collect results
-            for future in as_completed(futures):
-                # Check if should stop
-                if stop_flag_callback and not stop_flag_callback():
-                    # Cancel remaining futures
-                    for f in futures:
-                        f.cancel()
-                    break
-
-                result = future.result()
-                results.append(result)
+        # W trybie adaptacyjnym pula jest większa, a współbieżność reguluje limiter
+        num_workers = self.rate_limiter.worker_count(num_threads)
+        self.ensure_pool_size(num_workers)
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            # Ograniczone okno zadań - pamięć i czas reakcji na Stop nie zależą od liczby URL-i
+            for result in iter_bounded(
+                executor,
+                lambda url: self.fetch_url(url, max_retries),
+                urls,
+                max_in_flight=num_workers * 2,
+                stop_flag_callback=stop_flag_callback
+            ):
+                if result_callback:
+                    result_callback(result)
+                else:
+                    results.append(result)
                 processed += 1
 
                 if progress_callback:
@@ -79,6 +129,87 @@ class JinaClient:
 
         return results
 
+    def fetch_urls_async(
+        self,
+        urls: list,
+        concurrency: int = 200,
+        max_retries: int = 3,
+        progress_callback=None,
+        stop_flag_callback=None,
+        result_callback=None
+    ) -> list:
+        """
+        Pobierz treść wielu URL przez silnik asyncio (aiohttp) w jednym wątku
+
+        Zwraca wyniki w tym samym formacie co fetch_urls_parallel i używa tych
+        samych callbacków. Liczba równoczesnych zapytań jest ograniczona przez
+        concurrency (kilkaset bez kosztu wątków systemowych).
+        """
+        return asyncio.run(self._fetch_all_async(
+            urls, concurrency, max_retries, progress_callback, stop_flag_callback, result_callback
+        ))
+
+    async def _fetch_all_async(self, urls, concurrency, max_retries, progress_callback,
+                               stop_flag_callback, result_callback) -> list:
+        """Pętla asyncio: stała pula workerów pobiera kolejne URL-e ze wspólnego iteratora"""
+        try:
+            import aiohttp
+        except ImportError:
+            raise RuntimeError("Silnik asyncio wymaga pakietu aiohttp (pip install aiohttp)")
+
+        results = []
+        total = len(urls)
+        processed = 0
+        remaining = iter(urls)
+
+        # W trybie adaptacyjnym workerów jest więcej, a współbieżność reguluje limiter
+        num_workers = self.rate_limiter.worker_count(concurrency)
+        connector = aiohttp.TCPConnector(limit=num_workers, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1])
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers) as session:
+            async def worker():
+                nonlocal processed
+                for url in remaining:
+                    if stop_flag_callback and not stop_flag_callback():
+                        break
+                    result = await self._fetch_url_async(session, url, max_retries)
+                    if result_callback:
+                        result_callback(result)
+                    else:
+                        results.append(result)
+                    processed += 1
+                    if progress_callback:
+                        progress_callback(processed, total)
+
+            await asyncio.gather(*(worker() for _ in range(max(1, min(num_workers, total)))))
+
+        return results
+
+    async def _fetch_url_async(self, session, url: str, max_retries: int) -> Dict[str, str]:
+        """Pobierz treść pojedynczego URL (asyncio)"""
+        cached = self._cached(url)
+        if cached is not None:
+            return cached
+
+        for attempt in range(max_retries + 1):
+            try:
+                async with self.rate_limiter.async_slot():
+                    async with session.post(self.base_url, json={"url": url}) as response:
+                        response.raise_for_status()
+                        content = await response.text()
+                        etag = response.headers.get('ETag')
+                self.rate_limiter.report_success()
+                self._store(url, content, etag)
+                return {"url": url, "content": content}
+            except Exception as e:
+                self.rate_limiter.report_error(e)
+                if attempt < max_retries:
+                    await asyncio.sleep(self.rate_limiter.retry_delay(attempt, e))
+                    continue
+                else:
+                    return {"url": url, "content": "", "error": str(e)}
+
     def test_connection(self) -> bool:
         """Testuj połączenie z API"""
         try:
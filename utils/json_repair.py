@@ -0,0 +1,182 @@
+"""
+JSON Repair - tolerancyjne parsowanie odpowiedzi LLM (naprawa zamiast ponawiania zapytania)
+"""
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .text_cleaning import clean_field
+
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+# Maksymalna liczba prób: kolejnych początków JSON i punktów obcięcia
+_MAX_STARTS = 5
+_MAX_CUTS = 50
+
+
+def _scan(text: str, start: int) -> Tuple[str, List[str], bool, List[Tuple[int, List[str]]]]:
+    """
+    Przepisz JSON od pozycji start, poprawiając drobne błędy
+
+    Usuwa przecinki przed nawiasem zamykającym, zamienia literały Pythona
+    (True/False/None) i kończy na domknięciu obiektu głównego (tekst po
+    nim jest pomijany).
+
+    Returns:
+        Krotka (przepisany tekst, otwarte nawiasy, czy urwany w napisie,
+        punkty obcięcia: (długość tekstu, otwarte nawiasy) przed każdym przecinkiem)
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    cuts: List[Tuple[int, List[str]]] = []
+    in_string = escape = False
+    i = start
+    length = len(text)
+
+    while i < length:
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            i += 1
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]':
+            # Przecinek przed nawiasem zamykającym (np. [1, 2,])
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+            if not stack or stack[-1] != char:
+                break
+            stack.pop()
+            out.append(char)
+            if not stack:
+                return ''.join(out), stack, False, cuts
+            i += 1
+            continue
+        elif char == ',':
+            cuts.append((len(out), list(stack)))
+        elif char.isalpha():
+            end = i
+            while end < length and text[end].isalpha():
+                end += 1
+            word = text[i:end]
+            out.append(_LITERALS.get(word, word))
+            i = end
+            continue
+        out.append(char)
+        i += 1
+
+    return ''.join(out), stack, in_string, cuts
+
+
+def _close(text: str, stack: List[str]) -> str:
+    """Domknij otwarte nawiasy (bez końcowego przecinka lub dwukropka)"""
+    text = text.rstrip()
+    while text and text[-1] in ',:':
+        text = text[:-1].rstrip()
+    return text + ''.join(reversed(stack))
+
+
+def repair_json(text: str, roots: str = '{[', allow_truncated: bool = True) -> Any:
+    """
+    Wyodrębnij i napraw JSON z odpowiedzi modelu
+
+    Obsługuje tekst przed i po JSON (w tym bloki ```json), przecinki przed
+    nawiasem zamykającym, literały Pythona oraz - jeśli allow_truncated -
+    odpowiedź urwaną przed domknięciem: niekompletny ostatni element jest
+    odrzucany, a nawiasy domykane.
+
+    Raises:
+        json.JSONDecodeError: Nie udało się naprawić
+    """
+    text = clean_field(text) or ''
+    error: Optional[json.JSONDecodeError] = None
+    starts = [i for i, char in enumerate(text) if char in roots][:_MAX_STARTS]
+
+    for start in starts:
+        rewritten, stack, in_string, cuts = _scan(text, start)
+        candidates = []
+        if not stack:
+            candidates.append(rewritten)
+        elif allow_truncated:
+            if not in_string:
+                candidates.append(_close(rewritten, stack))
+            # Odrzuć niekompletny element: obetnij przed kolejnymi przecinkami od końca
+            for position, cut_stack in reversed(cuts[-_MAX_CUTS:]):
+                candidates.append(_close(rewritten[:position], cut_stack))
+
+        for candidate in candidates:
+            try:
+                result = json.loads(candidate)
+            except json.JSONDecodeError as e:
+                error = error or e
+                continue
+            # Domknięcie samego nawiasu otwierającego ({} lub []) to nie naprawa
+            if result or not stack:
+                return result
+
+    if error is None:
+        error = json.JSONDecodeError("Brak JSON w odpowiedzi", text, 0)
+    raise error
+
+
+class TolerantJsonParser:
+    """
+    Parsowanie odpowiedzi JSON z lokalną naprawą i licznikami
+
+    Najpierw zwykłe json.loads; przy błędzie próba naprawy. Każda udana
+    naprawa to zapytanie, którego nie trzeba ponawiać. Bezpieczny dla wątków.
+    """
+
+    def __init__(self, roots: str = '{['):
+        """
+        Args:
+            roots: Znaki, od których może zaczynać się JSON ('{' - tylko obiekt)
+        """
+        self.roots = roots
+        self.parsed = 0
+        self.repaired = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def loads(self, text: str, allow_truncated: bool = True) -> Any:
+        """
+        Zdekoduj odpowiedź, w razie potrzeby naprawiając JSON
+
+        Raises:
+            json.JSONDecodeError: Naprawa się nie udała (wywołujący ponawia zapytanie)
+        """
+        try:
+            result = json.loads(clean_field(text))
+            with self._lock:
+                self.parsed += 1
+            return result
+        except (json.JSONDecodeError, TypeError):
+            pass
+
+        try:
+            result = repair_json(text, self.roots, allow_truncated)
+        except json.JSONDecodeError:
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.repaired += 1
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """Liczniki: poprawne, naprawione lokalnie (zaoszczędzone zapytania), nienaprawialne"""
+        with self._lock:
+            return {"parsed": self.parsed, "repaired": self.repaired, "failed": self.failed}
@@ -0,0 +1,178 @@
+"""
+JSON Stream - przyrostowe parsowanie JSON z odpowiedzi strumieniowanych przez LLM
+"""
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+
+class JsonStreamError(ValueError):
+    """Odpowiedź strumieniowana nie jest (lub nie będzie) poprawnym JSON"""
+
+
+class JsonStreamParser:
+    """
+    Przyrostowy parser JSON dla fragmentów tekstu z odpowiedzi strumieniowanej
+
+    Śledzi zagnieżdżenie nawiasów i napisów, więc niezgodny nawias lub brak
+    JSON na początku odpowiedzi przerywa parsowanie od razu, a nie po
+    odebraniu całej odpowiedzi. Elementy tablic o wskazanych kluczach
+    obiektu głównego (np. "categories") są zwracane z feed() zaraz po
+    domknięciu. Tekst przed JSON (np. ```json) i po nim jest pomijany;
+    `complete` mówi, czy obiekt główny został domknięty.
+    """
+
+    def __init__(self, item_keys: Iterable[str] = (), roots: str = '{[', max_preamble: int = 4096):
+        """
+        Args:
+            item_keys: Klucze obiektu głównego, których elementy tablic są zwracane na bieżąco
+            roots: Znaki, od których może zaczynać się JSON ('{' - tylko obiekt)
+            max_preamble: Maksymalna liczba znaków przed początkiem JSON
+        """
+        self.item_keys = set(item_keys)
+        self.roots = roots
+        self.max_preamble = max_preamble
+        self.items_count = 0
+        self.complete = False
+
+        self._started = False
+        self._preamble = 0
+        # Ramki: [typ '{'/'[', klucz rodzica, oczekiwany klucz (obiekt), bieżący klucz (obiekt)]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escape = False
+        self._key_chars: List[str] = []
+        self._capture_key = False
+        self._item_parts: List[str] = []
+        self._item_depth = 0
+
+    def _is_item_array(self) -> bool:
+        """Czy bieżący kontener to tablica elementów zwracanych na bieżąco"""
+        return (len(self._stack) == 2 and self._stack[0][0] == '{'
+                and self._stack[1][0] == '[' and self._stack[1][1] in self.item_keys)
+
+    def feed(self, chunk: str) -> List[Any]:
+        """
+        Przetwórz kolejny fragment tekstu
+
+        Returns:
+            Elementy domknięte w tym fragmencie
+
+        Raises:
+            JsonStreamError: Niepoprawna struktura lub brak JSON na początku
+        """
+        items = []
+        if self.complete or not chunk:
+            return items
+
+        item_start = 0 if self._item_depth else -1
+        for i, char in enumerate(chunk):
+            if not self._started:
+                if char in self.roots:
+                    self._started = True
+                    self._stack.append([char, None, char == '{', None])
+                    continue
+                self._preamble += 1
+                if self._preamble > self.max_preamble:
+                    raise JsonStreamError("Brak JSON na początku odpowiedzi")
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._capture_key:
+                        self._stack[-1][3] = ''.join(self._key_chars)
+                        self._capture_key = False
+                    continue
+                if self._capture_key:
+                    self._key_chars.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                frame = self._stack[-1]
+                if frame[0] == '{' and frame[2]:
+                    self._capture_key = True
+                    self._key_chars = []
+            elif char in '{[':
+                if self._is_item_array() and not self._item_depth:
+                    item_start = i
+                    self._item_parts = []
+                if self._item_depth or item_start == i:
+                    self._item_depth += 1
+                parent = self._stack[-1]
+                self._stack.append([char, parent[3] if parent[0] == '{' else None, char == '{', None])
+            elif char in '}]':
+                frame = self._stack.pop()
+                if (frame[0] == '{') != (char == '}'):
+                    raise JsonStreamError(f"Niezgodny nawias '{char}' w odpowiedzi")
+                if self._item_depth:
+                    self._item_depth -= 1
+                    if not self._item_depth:
+                        self._item_parts.append(chunk[item_start:i + 1])
+                        item_start = -1
+                        items.append(self._parse_item(''.join(self._item_parts)))
+                if not self._stack:
+                    self.complete = True
+                    return items
+            elif char == ',':
+                if self._stack[-1][0] == '{':
+                    self._stack[-1][2] = True
+            elif char == ':':
+                if self._stack[-1][0] == '{':
+                    self._stack[-1][2] = False
+
+        if self._item_depth:
+            self._item_parts.append(chunk[item_start:])
+        return items
+
+    def _parse_item(self, text: str) -> Any:
+        """Zdekoduj domknięty element"""
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise JsonStreamError(f"Niepoprawny JSON elementu: {e}")
+        self.items_count += 1
+        return item
+
+
+class PartialResultWriter:
+    """
+    Zapis na dysk elementów odebranych do tej pory (np. categories_final.partial.json)
+
+    Elementy są grupowane (np. po gałęzi kroku 5), żeby ponowienie zapytania
+    zastępowało tylko elementy swojej grupy. Plik jest nadpisywany atomowo.
+    """
+
+    def __init__(self, path, key: str = "categories"):
+        self.path = Path(path)
+        self.key = key
+        self._groups: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def reset(self, group: str = ""):
+        """Wyczyść elementy grupy (nowa próba zapytania)"""
+        with self._lock:
+            self._groups[group] = []
+
+    def add(self, item: Any, group: str = ""):
+        """Dodaj element i zapisz plik"""
+        with self._lock:
+            self._groups.setdefault(group, []).append(item)
+            items = [item for group_items in self._groups.values() for item in group_items]
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({self.key: items}, f, indent=2, ensure_ascii=False)
+            tmp_path.replace(self.path)
+
+    def discard(self):
+        """Usuń plik częściowy (po zapisaniu pełnego wyniku)"""
+        with self._lock:
+            self._groups.clear()
+            if self.path.exists():
+                self.path.unlink()
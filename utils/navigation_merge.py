@@ -0,0 +1,166 @@
+"""
+Navigation Merge - scalanie częściowych struktur nawigacji z kroku 4 (tree-reduce)
+"""
+import re
+import unicodedata
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, Optional
+
+# Grupy nazw rodzeństwa do uzgodnienia -> {klucz grupy: {nazwa: nazwa docelowa}}
+Reconciler = Callable[[Dict[str, List[str]]], Dict[str, Dict[str, str]]]
+
+_NON_ALNUM = re.compile(r'[\W_]+')
+
+# Klucz grupy kategorii głównych w zapytaniu o uzgodnienie nazw
+ROOT_GROUP = "main_navigation"
+
+
+def name_key(name: str) -> str:
+    """
+    Klucz porównania nazw kategorii
+
+    Bez wielkości liter, znaków diakrytycznych i interpunkcji - "Meble ogrodowe",
+    "meble-ogrodowe" i "MEBLE OGRODOWE" trafiają do jednego węzła.
+    """
+    decomposed = unicodedata.normalize('NFKD', str(name).replace('ł', 'l').replace('Ł', 'L'))
+    ascii_name = ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return _NON_ALNUM.sub(' ', ascii_name).strip()
+
+
+def _clean(nodes) -> List[Dict]:
+    """Węzły w postaci {"name", "subcategories"} (pomija wpisy bez nazwy)"""
+    cleaned = []
+    for node in nodes if isinstance(nodes, list) else []:
+        if isinstance(node, str):
+            node = {"name": node}
+        if not isinstance(node, dict) or not str(node.get("name", "")).strip():
+            continue
+        cleaned.append({
+            **node,
+            "name": str(node["name"]).strip(),
+            "subcategories": _clean(node.get("subcategories", []))
+        })
+    return cleaned
+
+
+def merge_nodes(left: List[Dict], right: List[Dict]) -> List[Dict]:
+    """
+    Scal dwie listy węzłów rodzeństwa rekurencyjnie (pełna głębokość)
+
+    Węzły o tym samym kluczu nazwy są łączone, a ich podkategorie scalane
+    dalej; zostaje pisownia z pierwszego wystąpienia.
+    """
+    merged: Dict[str, Dict] = {}
+    for node in _clean(left) + _clean(right):
+        key = name_key(node["name"])
+        if key in merged:
+            existing = merged[key]
+            existing["subcategories"] = merge_nodes(existing["subcategories"], node["subcategories"])
+        else:
+            merged[key] = node
+    return list(merged.values())
+
+
+def _apply_renames(nodes: List[Dict], renames: Dict[str, str]) -> List[Dict]:
+    """Zmień nazwy węzłów według mapy i scal powstałe duplikaty"""
+    if not renames:
+        return nodes
+    by_key = {name_key(old): new for old, new in renames.items() if isinstance(new, str) and new.strip()}
+    renamed = []
+    for node in nodes:
+        new_name = by_key.get(name_key(node["name"]))
+        renamed.append({**node, "name": new_name.strip()} if new_name else node)
+    return merge_nodes(renamed, [])
+
+
+def reconcile_tree(nodes: List[Dict], reconcile: Reconciler) -> List[Dict]:
+    """
+    Uzgodnij nazwy bliskich duplikatów przez zewnętrzny reconciler (np. LLM)
+
+    W jednym wywołaniu przekazywane są kategorie główne oraz podkategorie
+    każdej kategorii głównej (dwa górne poziomy).
+    """
+    groups = {ROOT_GROUP: [node["name"] for node in nodes]}
+    for node in nodes:
+        if len(node["subcategories"]) > 1:
+            groups[node["name"]] = [child["name"] for child in node["subcategories"]]
+    if len(groups[ROOT_GROUP]) < 2 and len(groups) == 1:
+        return nodes
+
+    renames = reconcile(groups) or {}
+    for node in nodes:
+        node["subcategories"] = _apply_renames(node["subcategories"], renames.get(node["name"], {}))
+    return _apply_renames(nodes, renames.get(ROOT_GROUP, {}))
+
+
+def _finish(nodes: List[Dict], sort: bool, top: bool = True) -> List[Dict]:
+    """
+    Wynikowa lista węzłów (opcjonalnie posortowana na każdym poziomie)
+
+    Liście poniżej kategorii głównych nie dostają pustej listy
+    "subcategories" (jak w dotychczasowym formacie wyjścia kroków 4 i 5).
+    """
+    if sort:
+        nodes = sorted(nodes, key=lambda node: name_key(node["name"]))
+    result = []
+    for node in nodes:
+        children = _finish(node["subcategories"], sort, top=False)
+        node = {key: value for key, value in node.items() if key != "subcategories"}
+        if children or top:
+            node["subcategories"] = children
+        result.append(node)
+    return result
+
+
+def merge_branches(branches: List[List[Dict]], reconcile: Optional[Reconciler] = None) -> List[Dict]:
+    """
+    Połącz niezależnie przetworzone gałęzie drzewa (deduplikacja między gałęziami)
+
+    Kategorie o tym samym kluczu nazwy z różnych gałęzi są scalane, a
+    opcjonalny reconciler dostaje w jednym wywołaniu same nazwy dwóch
+    górnych poziomów. Kolejność kategorii z gałęzi jest zachowana.
+    """
+    merged = merge_nodes([node for branch in branches for node in _clean(branch)], [])
+    if reconcile:
+        merged = reconcile_tree(merged, reconcile)
+    return _finish(merged, sort=False)
+
+
+def tree_reduce(
+    trees: List[List[Dict]],
+    reconcile: Optional[Reconciler] = None,
+    executor: Optional[Executor] = None
+) -> List[Dict]:
+    """
+    Scal częściowe drzewa nawigacji parami, runda po rundzie
+
+    W każdej rundzie sąsiednie drzewa są scalane parami (równolegle, jeśli
+    podano executor), a po scaleniu pary opcjonalnie uzgadniane są nazwy
+    bliskich duplikatów. Liczba rund rośnie logarytmicznie z liczbą paczek.
+
+    Args:
+        trees: Listy kategorii głównych z poszczególnych paczek
+        reconcile: Opcjonalna funkcja uzgadniania nazw (wywoływana przy każdym scaleniu)
+        executor: Pula do równoległego scalania par
+
+    Returns:
+        Scalona i posortowana lista kategorii głównych
+    """
+    def merge_pair(pair):
+        merged = merge_nodes(*pair)
+        return reconcile_tree(merged, reconcile) if reconcile else merged
+
+    level = [_clean(tree) for tree in trees]
+    if not level:
+        return []
+    if len(level) == 1:
+        level = [merge_nodes(level[0], [])]
+
+    while len(level) > 1:
+        pairs = [(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        merged = list(executor.map(merge_pair, pairs)) if executor else [merge_pair(pair) for pair in pairs]
+        if len(level) % 2:
+            merged.append(level[-1])
+        level = merged
+
+    return _finish(level[0], sort=True)
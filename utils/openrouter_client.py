@@ -1,14 +1,42 @@
 """
 OpenRouter API Client
 """
-import requests
-from typing import List, Dict, Optional
+import json
+import re
+from typing import Callable, List, Dict, Optional, Tuple
 
+from .http_session import PooledSession
+from .rate_limiter import RateLimiter
+from .response_cache import ResponseCache
 
-class OpenRouterClient:
+# Komunikaty dostawców o przekroczeniu kontekstu modelu
+_CONTEXT_LENGTH_ERROR = re.compile(
+    r'context[ _-]?(?:length|window)|maximum context|too many tokens|prompt is too long', re.IGNORECASE
+)
+
+
+class OpenRouterClient(PooledSession):
     """Klient do komunikacji z OpenRouter API"""
 
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        pool_size: int = 10,
+        timeout: Tuple[float, float] = (10, 600),
+        models_timeout: Tuple[float, float] = (10, 60),
+        rate_limiter: Optional[RateLimiter] = None,
+        response_cache: Optional[ResponseCache] = None
+    ):
+        """
+        Args:
+            api_key: Klucz API OpenRouter
+            pool_size: Rozmiar puli połączeń (liczba wątków wysyłających zapytania)
+            timeout: Timeout (połączenie, odczyt) dla chat completion w sekundach
+            models_timeout: Timeout (połączenie, odczyt) dla listy modeli
+            rate_limiter: Współdzielony limiter zapytań (domyślnie tylko backoff przy błędach)
+            response_cache: Cache odpowiedzi dla zapytań z temperature=0
+        """
+        super().__init__(pool_size)
         self.api_key = api_key
         self.base_url = "https://openrouter.ai/api/v1"
         self.headers = {
@@ -17,39 +45,190 @@ class OpenRouterClient:
             "HTTP-Referer": "https://nexus-navigation-architect.local",
             "X-Title": "Nexus Navigation Architect"
         }
+        self.timeout = timeout
+        self.models_timeout = models_timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.response_cache = response_cache
 
     def list_models(self) -> List[Dict]:
         """Pobierz listę dostępnych modeli"""
-        response = requests.get(
+        response = self.session.get(
             f"{self.base_url}/models",
-            headers=self.headers
+            headers=self.headers,
+            timeout=self.models_timeout
         )
         response.raise_for_status()
         data = response.json()
         return data.get('data', [])
 
-    def chat_completion(
-        self,
-        model_id: str,
-        messages: List[Dict[str, str]],
-        max_tokens: int = 4000,
-        temperature: float = 0
-    ) -> Dict:
-        """Wykonaj chat completion"""
+    @staticmethod
+    def response_format_for(model: Optional[Dict], schema: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        response_format obsługiwany przez model (według supported_parameters z listy modeli)
+
+        Args:
+            model: Opis modelu z list_models() (None gdy nieznany)
+            schema: Schemat {"name", "strict", "schema"} dla structured outputs
+
+        Returns:
+            Schemat JSON, tryb JSON albo None, gdy model nie obsługuje żadnego
+        """
+        supported = (model or {}).get('supported_parameters') or []
+        if schema and 'structured_outputs' in supported:
+            return {"type": "json_schema", "json_schema": schema}
+        if 'response_format' in supported:
+            return {"type": "json_object"}
+        return None
+
+    @staticmethod
+    def _build_payload(model_id, messages, max_tokens, temperature, response_format) -> Dict:
+        """Treść zapytania chat completion (bez response_format klucz cache jest jak dotąd)"""
         payload = {
             "model": model_id,
             "messages": messages,
             "max_tokens": max_tokens,
             "temperature": temperature
         }
+        if response_format:
+            payload["response_format"] = response_format
+            # Tylko dostawcy obsługujący response_format
+            payload["provider"] = {"require_parameters": True}
+        return payload
 
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=self.headers,
-            json=payload
-        )
-        response.raise_for_status()
-        return response.json()
+    def chat_completion(
+        self,
+        model_id: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 4000,
+        temperature: float = 0,
+        use_cache: bool = True,
+        response_format: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Wykonaj chat completion
+
+        Odpowiedzi dla temperature=0 są zapisywane w cache (jeśli ustawiony).
+        use_cache=False pomija odczyt z cache (np. przy ponowieniu po
+        niepoprawnej odpowiedzi), a nowa odpowiedź zastępuje zapisaną.
+        response_format wymusza JSON (tryb JSON lub schemat - structured outputs).
+        """
+        payload = self._build_payload(model_id, messages, max_tokens, temperature, response_format)
+
+        cache = self.response_cache if temperature == 0 else None
+        if cache is not None and use_cache:
+            cached = cache.get(payload)
+            if cached is not None:
+                return cached
+
+        try:
+            with self.rate_limiter.slot():
+                response = self.session.post(
+                    f"{self.base_url}/chat/completions",
+                    headers=self.headers,
+                    json=payload,
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+        except Exception as e:
+            self.rate_limiter.report_error(e)
+            raise
+        self.rate_limiter.report_success()
+        result = response.json()
+        # Odpowiedzi z błędem dostawcy (HTTP 200 bez 'choices') i niedokończone
+        # (limit tokenów, przerwane generowanie) nie są zapisywane
+        if cache is not None and result.get('choices') and self.get_finish_reason(result) == 'stop':
+            cache.put(payload, result)
+        return result
+
+    def chat_completion_stream(
+        self,
+        model_id: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 4000,
+        temperature: float = 0,
+        use_cache: bool = True,
+        on_text: Optional[Callable[[str], None]] = None,
+        response_format: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Wykonaj chat completion ze strumieniowaniem odpowiedzi (SSE)
+
+        Fragmenty tekstu trafiają do on_text w miarę nadchodzenia. Wyjątek
+        zgłoszony w on_text (np. niepoprawny JSON) przerywa zapytanie i
+        zamyka połączenie. Zwraca odpowiedź w formacie chat_completion i
+        korzysta z tego samego cache (odpowiedź z cache trafia do on_text
+        jednym fragmentem).
+        """
+        payload = self._build_payload(model_id, messages, max_tokens, temperature, response_format)
+
+        cache = self.response_cache if temperature == 0 else None
+        if cache is not None and use_cache:
+            cached = cache.get(payload)
+            if cached is not None:
+                if on_text:
+                    on_text(cached['choices'][0]['message']['content'] or '')
+                return cached
+
+        try:
+            with self.rate_limiter.slot():
+                response = self.session.post(
+                    f"{self.base_url}/chat/completions",
+                    headers=self.headers,
+                    json={**payload, "stream": True},
+                    timeout=self.timeout,
+                    stream=True
+                )
+                try:
+                    response.raise_for_status()
+                    result = self._read_stream(response, on_text)
+                finally:
+                    response.close()
+        except Exception as e:
+            self.rate_limiter.report_error(e)
+            raise
+        self.rate_limiter.report_success()
+        # Strumień bez treści lub bez końcowego zdarzenia 'stop' (zerwany przez
+        # dostawcę, obcięty na limicie tokenów) nie jest zapisywany
+        if (cache is not None and result['choices'][0]['message']['content']
+                and self.get_finish_reason(result) == 'stop'):
+            cache.put(payload, result)
+        return result
+
+    def _read_stream(self, response, on_text: Optional[Callable[[str], None]]) -> Dict:
+        """Złóż odpowiedź ze zdarzeń SSE (linie 'data: {...}', koniec 'data: [DONE]')"""
+        response.encoding = 'utf-8'
+        parts = []
+        finish_reason = None
+        result = {}
+        for line in response.iter_lines(decode_unicode=True):
+            # Puste linie rozdzielają zdarzenia, ':' to komentarze (keep-alive)
+            if not line or line.startswith(':') or not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            event = json.loads(data)
+            if event.get('error'):
+                error = event['error']
+                raise RuntimeError(f"Błąd dostawcy: {error.get('message', error) if isinstance(error, dict) else error}")
+
+            for key in ('id', 'model', 'usage'):
+                if event.get(key):
+                    result[key] = event[key]
+            for choice in event.get('choices') or []:
+                text = (choice.get('delta') or {}).get('content')
+                if text:
+                    parts.append(text)
+                    if on_text:
+                        on_text(text)
+                finish_reason = choice.get('finish_reason') or finish_reason
+
+        result['choices'] = [{
+            "index": 0,
+            "message": {"role": "assistant", "content": ''.join(parts)},
+            "finish_reason": finish_reason
+        }]
+        return result
 
     def get_response_text(self, response: Dict) -> str:
         """Wyciągnij tekst odpowiedzi z response"""
@@ -58,6 +237,27 @@ class OpenRouterClient:
         except (KeyError, IndexError) as e:
             raise ValueError(f"Nieprawidłowa struktura odpowiedzi: {e}")
 
+    def get_finish_reason(self, response: Dict) -> Optional[str]:
+        """Powód zakończenia generowania ('stop', 'length' przy limicie max_tokens)"""
+        try:
+            return response['choices'][0].get('finish_reason')
+        except (KeyError, IndexError, AttributeError):
+            return None
+
+    @staticmethod
+    def is_context_length_error(error: Exception) -> bool:
+        """Czy błąd zapytania to przekroczenie kontekstu modelu (zapytanie za długie)"""
+        text = str(error)
+        response = getattr(error, 'response', None)
+        if response is not None:
+            if getattr(response, 'status_code', None) not in (400, 413):
+                return False
+            try:
+                text += response.text
+            except Exception:
+                pass
+        return bool(_CONTEXT_LENGTH_ERROR.search(text))
+
     def test_connection(self) -> bool:
         """Testuj połączenie z API"""
         try:
@@ -0,0 +1,95 @@
+"""
+Page Cache - współdzielony między projektami cache treści stron (Jina markdown)
+"""
+import hashlib
+import time
+import zlib
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .sqlite_lru import SqliteLruCache
+
+
+# Parametry śledzące pomijane przy normalizacji URL
+TRACKING_PARAMS = ('utm_', 'gclid', 'fbclid', 'msclkid', 'yclid', '_ga')
+
+
+def normalize_url(url: str) -> str:
+    """
+    Znormalizuj URL do klucza cache
+
+    Małe litery w schemacie i hoście, bez domyślnego portu, fragmentu i
+    parametrów śledzących, parametry zapytania posortowane. Niepoprawny URL
+    (np. port 'abc') jest kluczem bez zmian - błąd zgłosi dopiero pobieranie.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url.strip()
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        host = f"{host}:{port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+
+class PageCache(SqliteLruCache):
+    """
+    Cache treści stron w SQLite, adresowany hashem znormalizowanego URL
+
+    Treść jest kompresowana (zlib), a wpisy starsze niż TTL traktowane jak
+    brakujące. Po przekroczeniu limitu rozmiaru usuwane są najdawniej używane
+    wpisy (LRU). Jedna instancja może być używana z wielu wątków.
+    """
+
+    def __init__(self, db_path="cache/pages.sqlite", ttl_days: float = 30, max_size_mb: int = 2048):
+        """
+        Args:
+            db_path: Ścieżka bazy SQLite (domyślnie wspólna dla wszystkich projektów)
+            ttl_days: Czas ważności wpisu w dniach (0 = bez limitu)
+            max_size_mb: Maksymalny rozmiar skompresowanych treści w MB
+        """
+        super().__init__(
+            db_path, "pages",
+            "url TEXT NOT NULL, content BLOB NOT NULL, etag TEXT, fetched_at REAL NOT NULL",
+            max_size_mb
+        )
+        self.ttl_seconds = ttl_days * 86400
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        """Klucz wpisu - SHA-256 znormalizowanego URL"""
+        return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+    def get(self, url: str) -> Optional[Dict]:
+        """
+        Pobierz treść z cache
+
+        Returns:
+            {"content", "etag", "fetched_at"} lub None gdy brak / wpis przeterminowany
+        """
+        row = self._lookup(
+            self.make_key(url), ("content", "etag", "fetched_at"),
+            valid=lambda row: not self.ttl_seconds or time.time() - row[2] <= self.ttl_seconds
+        )
+        if row is None:
+            return None
+        return {
+            "content": zlib.decompress(row[0]).decode('utf-8'),
+            "etag": row[1],
+            "fetched_at": row[2]
+        }
+
+    def put(self, url: str, content: str, etag: Optional[str] = None):
+        """Zapisz treść strony"""
+        blob = zlib.compress(content.encode('utf-8'), 6)
+        self._write(
+            self.make_key(url),
+            {"url": url, "content": blob, "etag": etag, "fetched_at": time.time()},
+            len(blob)
+        )
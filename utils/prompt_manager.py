@@ -3,7 +3,7 @@ Prompt Manager - Zarządzanie promptami systemowymi
 """
 import json
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
 
 class PromptManager:
@@ -11,7 +11,9 @@ class PromptManager:
 
     def __init__(self, default_prompts_path: str = "config/default_prompts.json"):
         self.default_path = Path(default_prompts_path)
+        self.schemas_path = self.default_path.with_name("response_schemas.json")
         self.current_prompts = self.load_default_prompts()
+        self._schemas = None
 
     def load_default_prompts(self) -> Dict:
         """Wczytaj domyślne prompty z pliku"""
@@ -22,10 +24,25 @@ class PromptManager:
             return json.load(f)
 
     def get_prompt(self, step: str) -> str:
-        """Pobierz prompt dla konkretnego kroku"""
-        prompt_data = self.current_prompts.get(step, {})
+        """Pobierz prompt dla konkretnego kroku (domyślny, gdy brak w bieżącej konfiguracji)"""
+        prompt_data = self.current_prompts.get(step) or self.load_default_prompts().get(step, {})
         return prompt_data.get("system_prompt", "")
 
+    def get_response_schema(self, step: str) -> Optional[Dict]:
+        """
+        Schemat JSON odpowiedzi dla kroku (structured outputs)
+
+        Returns:
+            Obiekt {"name", "strict", "schema"} z config/response_schemas.json lub None
+        """
+        if self._schemas is None:
+            if self.schemas_path.exists():
+                with open(self.schemas_path, 'r', encoding='utf-8') as f:
+                    self._schemas = json.load(f)
+            else:
+                self._schemas = {}
+        return self._schemas.get(step)
+
     def get_prompt_name(self, step: str) -> str:
         """Pobierz nazwę promptu"""
         prompt_data = self.current_prompts.get(step, {})
@@ -33,8 +50,13 @@ class PromptManager:
 
     def update_prompt(self, step: str, new_prompt: str):
         """Aktualizuj prompt dla kroku"""
-        if step in self.current_prompts:
-            self.current_prompts[step]["system_prompt"] = new_prompt
+        if step not in self.current_prompts:
+            # Konfiguracje zapisane przed dodaniem kroku nie mają jego promptu
+            defaults = self.load_default_prompts()
+            if step not in defaults:
+                return
+            self.current_prompts[step] = defaults[step]
+        self.current_prompts[step]["system_prompt"] = new_prompt
 
     def reset_to_defaults(self):
         """Resetuj wszystkie prompty do domyślnych"""
@@ -0,0 +1,274 @@
+"""
+Rate Limiter - limitowanie zapytań do API (token bucket, backoff, AIMD)
+"""
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional, Tuple
+
+
+# Statusy HTTP traktowane jako sygnał przeciążenia / limitu dostawcy
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Odczytaj nagłówek Retry-After (sekundy lub data HTTP) jako liczbę sekund"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def throttle_info(error: Exception) -> Tuple[bool, Optional[float]]:
+    """
+    Rozpoznaj błąd limitu dostawcy
+
+    Obsługuje requests.HTTPError (error.response) oraz aiohttp.ClientResponseError
+    (error.status / error.headers).
+
+    Returns:
+        Krotka (czy to limit/przeciążenie, sekundy z Retry-After lub None)
+    """
+    response = getattr(error, 'response', None)
+    if response is not None and getattr(response, 'status_code', None) is not None:
+        status = response.status_code
+        headers = response.headers
+    else:
+        status = getattr(error, 'status', None)
+        headers = getattr(error, 'headers', None) or {}
+
+    if status not in THROTTLE_STATUSES:
+        return False, None
+    return True, parse_retry_after(headers.get('Retry-After'))
+
+
+class TokenBucket:
+    """Token bucket - średnio `rate` zapytań na sekundę z chwilowym zapasem `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: Liczba zapytań na sekundę (0 = bez limitu)
+            capacity: Maksymalny zapas tokenów (domyślnie max(1, rate))
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Zarezerwuj token; zwraca czas (s), jaki trzeba odczekać przed zapytaniem"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class Backoff:
+    """Wykładniczy backoff z pełnym jitterem i respektowaniem Retry-After"""
+
+    def __init__(self, base: float = 1.0, cap: float = 60.0, max_retry_after: float = 300.0):
+        self.base = base
+        self.cap = cap
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Opóźnienie przed ponowieniem próby nr `attempt` (liczone od 0)"""
+        if retry_after is not None:
+            return min(self.max_retry_after, retry_after) + random.uniform(0, self.base)
+        return random.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+
+
+class AdaptiveConcurrency:
+    """
+    Adaptacyjny limit równoczesnych zapytań (AIMD)
+
+    Każda udana odpowiedź podnosi limit o 1/limit (ok. +1 na pełne "okno"
+    zapytań), a sygnał limitu dostawcy (429/503) zmniejsza go o połowę - nie
+    częściej niż raz na `cooldown` sekund, żeby seria odrzuceń z jednej fali
+    nie zbiła limitu do minimum.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None,
+                 decrease_factor: float = 0.5, cooldown: float = 2.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum if maximum is not None else initial)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        """Zajmij slot, jeśli jest wolny"""
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        """Zajmij slot (blokująco)"""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait(0.5)
+            self.in_flight += 1
+
+    def release(self):
+        """Zwolnij slot"""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self):
+        """Addytywny wzrost limitu"""
+        with self._cond:
+            if self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self._cond.notify_all()
+
+    def on_throttle(self):
+        """Multiplikatywny spadek limitu"""
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                self._last_decrease = now
+
+
+class RateLimiter:
+    """
+    Wspólny limiter zapytań dla jednego dostawcy API (Jina / OpenRouter)
+
+    Łączy token bucket (zapytania/s), globalną pauzę po Retry-After, backoff
+    z jitterem dla ponowień oraz opcjonalny adaptacyjny limit współbieżności.
+    Jedna instancja jest współdzielona przez wszystkie wątki danego kroku.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 0,
+        initial_concurrency: int = 10,
+        max_concurrency: Optional[int] = None,
+        adaptive: bool = False,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        """
+        Args:
+            requests_per_second: Limit zapytań na sekundę (0 = bez limitu)
+            initial_concurrency: Początkowa liczba równoczesnych zapytań (liczba wątków)
+            max_concurrency: Górny limit współbieżności dla trybu adaptacyjnego
+            adaptive: Włącz adaptacyjną współbieżność (AIMD)
+            base_delay: Bazowe opóźnienie backoffu w sekundach
+            max_delay: Maksymalne opóźnienie backoffu w sekundach
+        """
+        self.bucket = TokenBucket(requests_per_second)
+        self.backoff = Backoff(base_delay, max_delay)
+        self.adaptive = adaptive
+        self.concurrency = None
+        if adaptive:
+            self.concurrency = AdaptiveConcurrency(
+                initial_concurrency,
+                maximum=max_concurrency or initial_concurrency * 4
+            )
+        self._pause_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def current_limit(self) -> Optional[int]:
+        """Aktualny limit współbieżności (None gdy wyłączony tryb adaptacyjny)"""
+        return int(self.concurrency.limit) if self.concurrency else None
+
+    def worker_count(self, configured: int) -> int:
+        """Liczba wątków puli - w trybie adaptacyjnym górny limit współbieżności"""
+        if self.concurrency:
+            return max(configured, self.concurrency.maximum)
+        return configured
+
+    def _wait_time(self) -> float:
+        """Czas do odczekania: globalna pauza po Retry-After + token bucket"""
+        with self._lock:
+            pause = max(0.0, self._pause_until - time.monotonic())
+        return pause + self.bucket.reserve()
+
+    @contextmanager
+    def slot(self):
+        """Zajmij miejsce na jedno zapytanie (wątki)"""
+        if self.concurrency:
+            self.concurrency.acquire()
+        try:
+            delay = self._wait_time()
+            if delay > 0:
+                time.sleep(delay)
+            yield
+        finally:
+            if self.concurrency:
+                self.concurrency.release()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """Zajmij miejsce na jedno zapytanie (asyncio)"""
+        if self.concurrency:
+            while not self.concurrency.try_acquire():
+                await asyncio.sleep(0.05)
+        try:
+            delay = self._wait_time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield
+        finally:
+            if self.concurrency:
+                self.concurrency.release()
+
+    def report_success(self):
+        """Zapytanie zakończone sukcesem"""
+        if self.concurrency:
+            self.concurrency.on_success()
+
+    def report_error(self, error: Exception) -> Optional[float]:
+        """
+        Zgłoś błąd zapytania; przy limicie dostawcy zmniejsza współbieżność
+        i wstrzymuje wszystkie wątki na czas z Retry-After
+
+        Returns:
+            Sekundy z Retry-After (jeśli podano)
+        """
+        throttled, retry_after = throttle_info(error)
+        if throttled:
+            if self.concurrency:
+                self.concurrency.on_throttle()
+            if retry_after:
+                with self._lock:
+                    self._pause_until = max(
+                        self._pause_until,
+                        time.monotonic() + min(self.backoff.max_retry_after, retry_after)
+                    )
+        return retry_after
+
+    def retry_delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Opóźnienie przed ponowieniem próby po błędzie"""
+        retry_after = throttle_info(error)[1] if error is not None else None
+        return self.backoff.delay(attempt, retry_after)
+
+    def wait_before_retry(self, attempt: int, error: Optional[Exception] = None):
+        """Odczekaj przed ponowieniem próby (wątki)"""
+        time.sleep(self.retry_delay(attempt, error))
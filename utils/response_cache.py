@@ -0,0 +1,55 @@
+"""
+Response Cache - trwały cache odpowiedzi LLM (kroki 3-5)
+"""
+import hashlib
+import json
+import time
+import zlib
+from typing import Dict, Optional
+
+from .sqlite_lru import SqliteLruCache
+
+
+class ResponseCache(SqliteLruCache):
+    """
+    Cache odpowiedzi chat completion w SQLite
+
+    Kluczem jest hash całego zapytania (model, wiadomości z promptem
+    systemowym, parametry generowania), więc zmiana promptu, modelu lub
+    danych wejściowych automatycznie omija stare wpisy. Po przekroczeniu
+    limitu rozmiaru usuwane są najdawniej używane odpowiedzi (LRU).
+    """
+
+    def __init__(self, db_path="cache/llm_responses.sqlite", max_size_mb: int = 512):
+        """
+        Args:
+            db_path: Ścieżka bazy SQLite (domyślnie wspólna dla wszystkich projektów)
+            max_size_mb: Maksymalny rozmiar skompresowanych odpowiedzi w MB
+        """
+        super().__init__(
+            db_path, "responses",
+            "model TEXT NOT NULL, response BLOB NOT NULL, created_at REAL NOT NULL",
+            max_size_mb
+        )
+
+    @staticmethod
+    def make_key(payload: Dict) -> str:
+        """Klucz wpisu - SHA-256 kanonicznego JSON zapytania"""
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, payload: Dict) -> Optional[Dict]:
+        """Odpowiedź zapisana dla zapytania (None gdy brak)"""
+        row = self._lookup(self.make_key(payload), ("response",))
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, payload: Dict, response: Dict):
+        """Zapisz odpowiedź dla zapytania"""
+        blob = zlib.compress(json.dumps(response, ensure_ascii=False).encode('utf-8'), 6)
+        self._write(
+            self.make_key(payload),
+            {"model": payload.get("model", ""), "response": blob, "created_at": time.time()},
+            len(blob)
+        )
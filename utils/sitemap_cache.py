@@ -0,0 +1,206 @@
+"""
+Sitemap Cache - cache pobranych sitemap w folderze projektu (conditional GET + lastmod)
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from .url_filter import url_key
+
+
+class SitemapCacheWriter:
+    """Zapis wpisów pojedynczej sitemap do pliku tymczasowego w cache"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + '.tmp')
+        self._file = gzip.open(self.tmp_path, 'wt', encoding='utf-8')
+        self.closed = False
+
+    def write(self, kind: str, loc: str, lastmod: str = ""):
+        """Dopisz wpis ('url' | 'sitemap', loc, lastmod)"""
+        self._file.write(f"{kind}\t{loc}\t{lastmod}\n")
+
+    def commit(self):
+        """Zamknij plik i podmień poprzednią wersję"""
+        if self.closed:
+            return
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+        self.closed = True
+
+    def discard(self):
+        """Porzuć niedokończony zapis"""
+        if self.closed:
+            return
+        self._file.close()
+        if self.tmp_path.exists():
+            self.tmp_path.unlink()
+        self.closed = True
+
+
+class SitemapCache:
+    """
+    Cache sitemap na dysku
+
+    Dla każdej sitemap przechowuje ETag/Last-Modified z odpowiedzi HTTP, wartość
+    <lastmod> z indeksu nadrzędnego oraz listę wpisów (bez filtrowania, więc
+    zmiana filtra URL nie unieważnia cache).
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / self.INDEX_FILE
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict]:
+        """Wczytaj indeks cache"""
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def save(self):
+        """Zapisz indeks cache"""
+        with self._lock:
+            tmp_path = self.index_path.with_name(self.INDEX_FILE + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+
+    def _data_path(self, url: str) -> Path:
+        """Ścieżka pliku z wpisami sitemap"""
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{digest}.tsv.gz"
+
+    def has_entries(self, url: str) -> bool:
+        """Czy cache zawiera kompletną listę wpisów dla sitemap"""
+        with self._lock:
+            entry = self._entries.get(url)
+        return entry is not None and self._data_path(url).exists()
+
+    def is_unchanged(self, url: str, lastmod: Optional[str]) -> bool:
+        """Czy sitemap jest niezmieniona według <lastmod> z indeksu nadrzędnego"""
+        if not lastmod:
+            return False
+        with self._lock:
+            entry = self._entries.get(url)
+        return (
+            entry is not None
+            and entry.get("lastmod") == lastmod
+            and self._data_path(url).exists()
+        )
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Nagłówki If-None-Match / If-Modified-Since dla zapisanej wersji"""
+        headers = {}
+        if not self.has_entries(url):
+            return headers
+        with self._lock:
+            entry = self._entries[url]
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def iter_entries(self, url: str) -> Iterator[Tuple[str, str, str]]:
+        """Odczytaj zapisane wpisy (kind, loc, lastmod)"""
+        with gzip.open(self._data_path(url), 'rt', encoding='utf-8') as f:
+            for line in f:
+                kind, loc, lastmod = line.rstrip('\n').split('\t')
+                yield kind, loc, lastmod
+
+    def open_writer(self, url: str) -> SitemapCacheWriter:
+        """Rozpocznij zapis nowej wersji sitemap"""
+        return SitemapCacheWriter(self._data_path(url))
+
+    def commit(
+        self,
+        url: str,
+        writer: SitemapCacheWriter,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        lastmod: Optional[str] = None
+    ):
+        """Zatwierdź zapis wpisów i zaktualizuj metadane sitemap"""
+        writer.commit()
+        with self._lock:
+            self._entries[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "lastmod": lastmod,
+                "fetched_at": datetime.now().isoformat()
+            }
+
+    def touch(self, url: str, lastmod: Optional[str] = None):
+        """Oznacz sitemap jako aktualną (np. po odpowiedzi 304)"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return
+            if lastmod:
+                entry["lastmod"] = lastmod
+            entry["fetched_at"] = datetime.now().isoformat()
+
+    def prune(self, keep_urls: Iterable[str]):
+        """Usuń z cache sitemapy, które nie występują już w indeksie"""
+        keep = set(keep_urls)
+        with self._lock:
+            stale = [url for url in self._entries if url not in keep]
+            for url in stale:
+                del self._entries[url]
+        for url in stale:
+            path = self._data_path(url)
+            if path.exists():
+                path.unlink()
+
+
+def write_url_delta(old_path: str, new_path: str, added_path: str, removed_path: str) -> Tuple[int, int]:
+    """
+    Porównaj dwie listy URL-i i zapisz pliki z dodanymi i usuniętymi URL-ami
+
+    W pamięci trzymane są tylko 64-bitowe klucze URL-i, a nie same adresy.
+
+    Returns:
+        Krotka (liczba dodanych, liczba usuniętych)
+    """
+    def iter_urls(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                url = line.strip()
+                if url:
+                    yield url
+
+    old_keys = {url_key(url) for url in iter_urls(old_path)}
+    new_keys = set()
+    added = 0
+    with open(added_path, 'w', encoding='utf-8') as f:
+        for url in iter_urls(new_path):
+            key = url_key(url)
+            new_keys.add(key)
+            if key not in old_keys:
+                f.write(url + '\n')
+                added += 1
+    del old_keys
+
+    removed = 0
+    with open(removed_path, 'w', encoding='utf-8') as f:
+        for url in iter_urls(old_path):
+            if url_key(url) not in new_keys:
+                f.write(url + '\n')
+                removed += 1
+
+    return added, removed
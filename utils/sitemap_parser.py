@@ -1,21 +1,59 @@
 """
 Sitemap Parser - do pobierania listy URL produktów z sitemap
 """
-import requests
-from bs4 import BeautifulSoup
-from typing import List, Optional
+import gzip
+import io
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from .http_session import create_session
+from .url_filter import UrlDeduplicator, UrlFilter
+
+
+def _local_name(tag) -> str:
+    """Nazwa tagu XML bez namespace (np. '{http://...}url' -> 'url')"""
+    if not isinstance(tag, str):
+        return ""
+    return tag.rsplit('}', 1)[-1]
 
 
 class SitemapParser:
     """Parser sitemap XML"""
 
-    def __init__(self):
+    # Co ile znalezionych URL-i raportować postęp w trybie strumieniowym
+    PROGRESS_EVERY = 100000
+    # Maksymalna głębokość zagnieżdżenia sitemap index
+    MAX_DEPTH = 10
+
+    def __init__(self, max_workers: int = 1, session=None, cache=None, deduplicate: bool = True,
+                 timeout: Tuple[float, float] = (10, 120)):
+        """
+        Args:
+            max_workers: Liczba równolegle pobieranych sub-sitemap (1 = sekwencyjnie)
+            session: Opcjonalna współdzielona sesja HTTP (domyślnie własna pula połączeń)
+            cache: Opcjonalny SitemapCache - pomija niezmienione sitemapy (lastmod / 304)
+            deduplicate: Pomijaj URL-e powtarzające się między sitemapami
+            timeout: Timeout (połączenie, odczyt) w sekundach - zawieszony serwer nie
+                blokuje wątku puli na zawsze
+        """
         self.product_urls = []
+        self.deduplicate = deduplicate
+        self.duplicates_skipped = 0
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.session = session or create_session(pool_size=self.max_workers)
+        self.cache = cache
+        self.cache_stats = {'downloaded': 0, 'not_modified': 0, 'skipped_lastmod': 0}
+        self._stats_lock = threading.Lock()
 
     def parse_sitemap(
         self,
         sitemap_url: str,
-        filter_pattern: Optional[str] = None,
+        filter_pattern: Union[str, UrlFilter, None] = None,
         progress_callback=None
     ) -> List[str]:
         """
@@ -23,58 +61,344 @@ class SitemapParser:
 
         Args:
             sitemap_url: URL do sitemap index lub pojedynczego sitemap
-            filter_pattern: Pattern do filtrowania URL-i (np. ".html", "/product/")
+            filter_pattern: Reguły filtrowania URL-i (np. ".html", "/product/ !/blog/") - patrz UrlFilter
             progress_callback: Callback do raportowania postępu
 
         Returns:
             Lista przefiltrowanych URL-i produktów
         """
-        self.product_urls = []
+        self.product_urls = list(self.iter_product_urls(sitemap_url, filter_pattern, progress_callback))
+        return self.product_urls
+
+    def iter_product_urls(
+        self,
+        sitemap_url: str,
+        filter_pattern: Union[str, UrlFilter, None] = None,
+        progress_callback=None
+    ) -> Iterator[str]:
+        """
+        Strumieniowo parsuj sitemap i zwracaj przefiltrowane URL-e (generator)
+
+        XML jest parsowany przyrostowo (lxml iterparse) bezpośrednio ze strumienia
+        odpowiedzi HTTP, więc zużycie pamięci nie zależy od rozmiaru sitemap.
+        Zagnieżdżone sitemap index są przechodzone rekurencyjnie, a pliki
+        .xml.gz dekompresowane strumieniowo.
+
+        Args:
+            sitemap_url: URL do sitemap index lub pojedynczego sitemap
+            filter_pattern: Reguły filtrowania URL-i (np. ".html", "/product/ !/blog/") - patrz UrlFilter
+            progress_callback: Callback do raportowania postępu
 
+        Yields:
+            Przefiltrowane URL-e produktów
+        """
         if progress_callback:
             progress_callback("Pobieranie sitemap index...")
 
-        # Pobierz sitemap index
-        index_response = requests.get(sitemap_url)
-        index_response.raise_for_status()
-        index_content = index_response.content
+        state = {'found': 0, 'processed': 0, 'total': 0}
+        visited = {sitemap_url.strip()}
+        self.cache_stats = {'downloaded': 0, 'not_modified': 0, 'skipped_lastmod': 0}
+
+        # Reguły filtra są kompilowane raz na cały przebieg
+        url_filter = filter_pattern if isinstance(filter_pattern, UrlFilter) else UrlFilter.parse(filter_pattern)
+        dedup = UrlDeduplicator() if self.deduplicate else None
+
+        def accept(loc: str) -> bool:
+            if dedup is not None and not dedup.add(loc):
+                return False
+            state['found'] += 1
+            if progress_callback and state['found'] % self.PROGRESS_EVERY == 0:
+                progress_callback(f"Znaleziono {state['found']} URL-i...")
+            return True
 
-        # Parsuj XML
-        index_soup = BeautifulSoup(index_content, 'xml')
+        executor = ThreadPoolExecutor(max_workers=self.max_workers) if self.max_workers > 1 else None
+        try:
+            # Główny plik może być sitemap index (<sitemap>) lub zwykłym sitemap (<url>)
+            sitemap_urls = []
+            for kind, loc, lastmod in self._iter_entries(sitemap_url):
+                if kind == 'sitemap':
+                    sitemap_urls.append((loc, lastmod))
+                elif self._matches(loc, url_filter) and accept(loc):
+                    yield loc
 
-        # Sprawdź czy to sitemap index czy pojedynczy sitemap
-        sitemap_urls = [loc.text for loc in index_soup.find_all('loc')]
+            if sitemap_urls:
+                if progress_callback:
+                    progress_callback(f"Znaleziono {len(sitemap_urls)} sitemap(ów) do przetworzenia")
 
-        # Jeśli brak sub-sitemap, traktuj jako główny sitemap
-        if not sitemap_urls or sitemap_url in sitemap_urls:
-            sitemap_urls = [sitemap_url]
+                for loc in self._iter_children(sitemap_urls, url_filter, progress_callback,
+                                               executor, visited, state, depth=1):
+                    if accept(loc):
+                        yield loc
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+
+        if self.cache is not None:
+            # Pełne przejście - usuń z cache sitemapy, których już nie ma w indeksie
+            self.cache.prune(visited)
+            self.cache.save()
+            if progress_callback:
+                stats = self.cache_stats
+                progress_callback(
+                    f"Cache sitemap: {stats['skipped_lastmod']} bez zmian (lastmod), "
+                    f"{stats['not_modified']} bez zmian (304), {stats['downloaded']} pobranych"
+                )
+
+        if dedup is not None:
+            self.duplicates_skipped = dedup.duplicates
+            if progress_callback and dedup.duplicates:
+                progress_callback(f"Pominięto {dedup.duplicates} zduplikowanych URL-i")
 
         if progress_callback:
-            progress_callback(f"Znaleziono {len(sitemap_urls)} sitemap(ów) do przetworzenia")
+            progress_callback(f"Znaleziono {state['found']} URL-i produktów")
+
+    def _iter_children(
+        self,
+        sitemap_urls: List[Tuple[str, str]],
+        url_filter: Optional[UrlFilter],
+        progress_callback,
+        executor: Optional[ThreadPoolExecutor],
+        visited: Set[str],
+        state: Dict[str, int],
+        depth: int
+    ) -> Iterator[str]:
+        """
+        Przejdź sub-sitemapy (rekurencyjnie) i zwracaj przefiltrowane URL-e
 
-        # Pobierz i parsuj każdy sitemap
-        for idx, sm_url in enumerate(sitemap_urls, 1):
+        Kolejność wyników jest stała: URL-e sitemap w kolejności z indeksu, a
+        zagnieżdżone indeksy są rozwijane w miejscu wystąpienia (DFS). Adresy już
+        odwiedzone są pomijane (ochrona przed cyklami), a głębokość ograniczona
+        do MAX_DEPTH. Z executorem sub-sitemapy są pobierane równolegle w
+        ograniczonym oknie (2 x max_workers). Callback postępu jest wywoływany
+        wyłącznie z wątku wywołującego.
+        """
+        if depth > self.MAX_DEPTH:
             if progress_callback:
-                progress_callback(f"Przetwarzanie sitemap {idx}/{len(sitemap_urls)}")
+                progress_callback(f"⚠️ Pominięto {len(sitemap_urls)} sitemap(ów) - przekroczona głębokość {self.MAX_DEPTH}")
+            return
 
-            sm_response = requests.get(sm_url)
-            sm_response.raise_for_status()
-            sm_soup = BeautifulSoup(sm_response.content, 'xml')
+        # Ochrona przed cyklami i duplikatami w indeksach
+        unique_urls = []
+        for sm_url, lastmod in sitemap_urls:
+            key = sm_url.strip()
+            if key not in visited:
+                visited.add(key)
+                unique_urls.append((sm_url, lastmod))
+        state['total'] += len(unique_urls)
 
-            # Wyciągnij wszystkie URL-e
-            for url_tag in sm_soup.find_all('url'):
-                loc = url_tag.find('loc')
-                if loc:
-                    url = loc.text
+        for urls, nested in self._iter_fetched(unique_urls, url_filter, executor):
+            state['processed'] += 1
+            if progress_callback:
+                progress_callback(f"Przetwarzanie sitemap {state['processed']}/{state['total']}")
 
-                    # Filtruj według patternu jeśli podany
-                    if filter_pattern is None or filter_pattern in url:
-                        self.product_urls.append(url)
+            yield from urls
 
-        if progress_callback:
-            progress_callback(f"Znaleziono {len(self.product_urls)} URL-i produktów")
+            if nested:
+                if progress_callback:
+                    progress_callback(f"Znaleziono {len(nested)} zagnieżdżonych sitemap(ów)")
+                yield from self._iter_children(nested, url_filter, progress_callback,
+                                               executor, visited, state, depth + 1)
 
-        return self.product_urls
+    def _iter_fetched(
+        self,
+        sitemap_urls: List[Tuple[str, str]],
+        url_filter: Optional[UrlFilter],
+        executor: Optional[ThreadPoolExecutor]
+    ) -> Iterator[Tuple[Iterable[str], List[Tuple[str, str]]]]:
+        """
+        Pobieraj sitemapy i zwracaj pary (URL-e, zagnieżdżone sitemapy) w kolejności wejścia
+
+        Bez executora URL-e są oddawane strumieniowo (lista zagnieżdżonych
+        sitemap wypełnia się w trakcie iteracji po URL-ach).
+        """
+        if executor is None:
+            for sm_url, lastmod in sitemap_urls:
+                nested = []
+                yield self._stream_urls(sm_url, lastmod, url_filter, nested), nested
+            return
+
+        window = self.max_workers * 2
+        pending = deque()
+        remaining = iter(sitemap_urls)
+
+        def submit_next() -> bool:
+            item = next(remaining, None)
+            if item is None:
+                return False
+            sm_url, lastmod = item
+            pending.append(executor.submit(self._collect_entries, sm_url, lastmod, url_filter))
+            return True
+
+        try:
+            while len(pending) < window and submit_next():
+                pass
+
+            while pending:
+                result = pending.popleft().result()
+                submit_next()
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _stream_urls(
+        self,
+        sitemap_url: str,
+        lastmod: str,
+        url_filter: Optional[UrlFilter],
+        nested: List[Tuple[str, str]]
+    ) -> Iterator[str]:
+        """Strumieniuj URL-e z sitemap, dopisując napotkane sub-sitemapy do nested"""
+        for kind, loc, entry_lastmod in self._iter_entries(sitemap_url, lastmod):
+            if kind == 'sitemap':
+                nested.append((loc, entry_lastmod))
+            elif self._matches(loc, url_filter):
+                yield loc
+
+    def _collect_entries(
+        self,
+        sitemap_url: str,
+        lastmod: str,
+        url_filter: Optional[UrlFilter]
+    ) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """Pobierz pojedynczy sitemap i zwróć (przefiltrowane URL-e, sub-sitemapy) (wątek roboczy)"""
+        nested = []
+        urls = list(self._stream_urls(sitemap_url, lastmod, url_filter, nested))
+        return urls, nested
+
+    def parse_to_file(
+        self,
+        sitemap_url: str,
+        filepath: str,
+        filter_pattern: Union[str, UrlFilter, None] = None,
+        progress_callback=None
+    ) -> int:
+        """
+        Parsuj sitemap w trybie strumieniowym i zapisuj URL-e od razu do pliku
+
+        URL-e nie są trzymane w pamięci (product_urls pozostaje puste). Plik
+        docelowy jest podmieniany dopiero po udanym parsowaniu.
+
+        Returns:
+            Liczba zapisanych URL-i
+        """
+        self.product_urls = []
+        tmp_path = filepath + '.tmp'
+        count = 0
+
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for url in self.iter_product_urls(sitemap_url, filter_pattern, progress_callback):
+                    f.write(url + '\n')
+                    count += 1
+            os.replace(tmp_path, filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return count
+
+    def _iter_entries(self, url: str, lastmod: str = "") -> Iterator[Tuple[str, str, str]]:
+        """
+        Pobierz sitemap jako strumień i zwracaj wpisy ('url' | 'sitemap', loc, lastmod)
+
+        Przetworzone elementy są usuwane z drzewa na bieżąco, więc w pamięci
+        trzymany jest tylko aktualnie parsowany wpis. Z włączonym cache sitemap
+        niezmieniona według <lastmod> z indeksu nie jest w ogóle pobierana, a
+        pozostałe są pobierane warunkowo (If-None-Match / If-Modified-Since).
+        """
+        cache = self.cache
+        if cache is not None and cache.is_unchanged(url, lastmod):
+            self._bump_stat('skipped_lastmod')
+            yield from cache.iter_entries(url)
+            return
+
+        headers = cache.conditional_headers(url) if cache is not None else {}
+        response = self.session.get(url, stream=True, headers=headers, timeout=self.timeout)
+        try:
+            if response.status_code == 304 and cache is not None and cache.has_entries(url):
+                self._bump_stat('not_modified')
+                cache.touch(url, lastmod)
+                yield from cache.iter_entries(url)
+                return
+
+            response.raise_for_status()
+            self._bump_stat('downloaded')
+            # Dekompresja Content-Encoding (gzip/deflate) po stronie urllib3
+            response.raw.decode_content = True
+
+            writer = cache.open_writer(url) if cache is not None else None
+            try:
+                context = etree.iterparse(
+                    self._open_stream(response.raw),
+                    events=('end',),
+                    huge_tree=True,
+                    resolve_entities=False,
+                    no_network=True
+                )
+                for _, elem in context:
+                    name = _local_name(elem.tag)
+                    if name not in ('url', 'sitemap'):
+                        continue
+
+                    loc = None
+                    entry_lastmod = ""
+                    for child in elem:
+                        child_name = _local_name(child.tag)
+                        if child_name == 'loc' and child.text:
+                            loc = child.text.strip()
+                        elif child_name == 'lastmod' and child.text and name == 'sitemap':
+                            entry_lastmod = child.text.strip()
+                    if loc:
+                        if writer is not None:
+                            writer.write(name, loc, entry_lastmod)
+                        yield name, loc, entry_lastmod
+
+                    # Zwolnij pamięć: wyczyść element i usuń przetworzone rodzeństwo
+                    elem.clear()
+                    parent = elem.getparent()
+                    if parent is not None:
+                        while elem.getprevious() is not None:
+                            del parent[0]
+
+                if writer is not None:
+                    cache.commit(
+                        url,
+                        writer,
+                        etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified'),
+                        lastmod=lastmod
+                    )
+            finally:
+                if writer is not None:
+                    writer.discard()
+        finally:
+            response.close()
+
+    def _bump_stat(self, key: str):
+        """Zwiększ licznik statystyk cache (bezpiecznie wątkowo)"""
+        with self._stats_lock:
+            self.cache_stats[key] += 1
+
+    @staticmethod
+    def _open_stream(raw) -> io.BufferedIOBase:
+        """
+        Opakuj surowy strumień odpowiedzi, dekompresując pliki .xml.gz w locie
+
+        Rozpoznanie po sygnaturze gzip (1f 8b), a nie po rozszerzeniu - serwery
+        często podają sitemap.xml.gz bez Content-Encoding i odwrotnie.
+        """
+        # BufferedReader wymaga, by strumień nie zamykał się sam po EOF
+        raw.auto_close = False
+        stream = io.BufferedReader(raw)
+        if stream.peek(2)[:2] == b'\x1f\x8b':
+            return gzip.GzipFile(fileobj=stream, mode='rb')
+        return stream
+
+    @staticmethod
+    def _matches(url: str, url_filter: Optional[UrlFilter]) -> bool:
+        """Sprawdź czy URL pasuje do filtra"""
+        return url_filter is None or url_filter.matches(url)
 
     def save_to_file(self, filepath: str):
         """Zapisz URL-e do pliku tekstowego"""
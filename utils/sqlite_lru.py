@@ -0,0 +1,125 @@
+"""
+SQLite LRU - wspólna baza dla trwałych cache (strony, odpowiedzi LLM)
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+
+class SqliteLruCache:
+    """
+    Tabela SQLite z limitem rozmiaru i usuwaniem najdawniej używanych wpisów (LRU)
+
+    Każdy wpis ma klucz, kolumny podklasy, czas ostatniego użycia i rozmiar
+    w bajtach. Klasa pilnuje łącznego rozmiaru, liczy trafienia i chroni
+    połączenie blokadą - jedna instancja może być używana z wielu wątków.
+    Podklasy definiują tylko swoje kolumny oraz format kluczy i wartości.
+    """
+
+    def __init__(self, db_path, table: str, columns: str, max_size_mb: int):
+        """
+        Args:
+            db_path: Ścieżka bazy SQLite
+            table: Nazwa tabeli
+            columns: Definicje kolumn podklasy (SQL, bez key/last_access/size)
+            max_size_mb: Maksymalny łączny rozmiar wpisów w MB
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                {columns},
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_last_access ON {table}(last_access)")
+        self._total_bytes = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+
+    def _lookup(self, key: str, columns: Sequence[str],
+                valid: Optional[Callable[[Tuple], bool]] = None) -> Optional[Tuple]:
+        """
+        Odczytaj kolumny wpisu i odnotuj użycie
+
+        Args:
+            valid: Warunek ważności wiersza (np. TTL); nieważny liczy się jak brak
+
+        Returns:
+            Wiersz z podanymi kolumnami lub None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(columns)} FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (valid is not None and not valid(row)):
+                self.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return row
+
+    def _write(self, key: str, values: Dict[str, Any], size: int):
+        """Zapisz (lub zastąp) wpis o podanym rozmiarze i w razie potrzeby zwolnij miejsce"""
+        columns = ['key', *values, 'last_access', 'size']
+        placeholders = ', '.join('?' * len(columns))
+        with self._lock:
+            old = self._conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} ({', '.join(columns)}) VALUES ({placeholders})",
+                (key, *values.values(), time.time(), size)
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Usuń najdawniej używane wpisy do 90% limitu (wywoływane pod blokadą)"""
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY last_access LIMIT 500"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            removed = []
+            for key, size in rows:
+                removed.append((key,))
+                self._total_bytes -= size
+                if self._total_bytes <= target:
+                    break
+            self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", removed)
+
+    def reset_stats(self):
+        """Wyzeruj liczniki trafień (np. przed kolejnym krokiem)"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Statystyki cache"""
+        with self._lock:
+            count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": count,
+                "size_mb": round(self._total_bytes / (1024 * 1024), 1)
+            }
+
+    def close(self):
+        """Zamknij połączenie z bazą"""
+        with self._lock:
+            self._conn.close()
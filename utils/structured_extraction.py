@@ -0,0 +1,268 @@
+"""
+Structured Extraction - kategoria i parametry produktu z okruszków i tabel strony (krok 3 bez LLM)
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+_LINK = re.compile(r'!?\[([^\]]*)\]\(([^)\s]*)[^)]*\)')
+_CRUMB_SEPARATOR = re.compile(r'\s*(?:/|>|»|›|→|\\)\s*')
+_LIST_MARKER = re.compile(r'^\s*(?:[-*+]|\d+\.)\s+')
+_NUMBERED_ITEM = re.compile(r'^\s*(\d+)\.\s+(.*?)\s*$')
+_SINGLE_LINK = re.compile(r'^!?\[([^\]]*)\]\(([^)\s]*)[^)]*\)$')
+_BOLD_LABEL = re.compile(r'^\s*(?:[-*+]\s+)?\*\*([^*:\n]{1,60}?):?\*\*:?\s+(.{1,200}?)\s*$', re.MULTILINE)
+_TITLE_SEPARATOR = re.compile(r'\s+[-|–—:]\s+')
+_TABLE_RULE = re.compile(r'^\|?\s*:?-{2,}')
+_FORMATTING = re.compile(r'[*_`]+')
+_WHITESPACE = re.compile(r'\s+')
+
+# Pierwszy element okruszków - strona główna sklepu
+_HOME_WORDS = {"home", "strona główna", "start", "główna", "sklep", "shop", "strona glowna", "homepage"}
+
+# Nagłówki tabel specyfikacji (wiersz nagłówka nie jest parametrem)
+_HEADER_WORDS = {"parametr", "parametry", "wartość", "cecha", "właściwość", "specyfikacja",
+                 "name", "value", "attribute", "feature", "property", "specification"}
+
+_MAX_NAME_LENGTH = 60
+_MAX_PARAMETERS = 50
+
+# Minimalna liczba parametrów z tabeli specyfikacji dla ekstrakcji bez LLM
+MIN_TABLE_PARAMETERS = 3
+
+
+def _text(markdown: str) -> str:
+    """Tekst bez linków, formatowania i nadmiarowych białych znaków"""
+    markdown = _LINK.sub(lambda m: m.group(1), markdown)
+    return _WHITESPACE.sub(' ', _FORMATTING.sub('', markdown)).strip()
+
+
+def page_title(content: str) -> str:
+    """Tytuł strony z nagłówka odpowiedzi Jina ('Title: ...')"""
+    if content.startswith('Title:'):
+        return content[6:content.find('\n') if '\n' in content else None].strip()
+    return ''
+
+
+def _parse_crumbs(line: str) -> Optional[List[Tuple[str, Optional[str]]]]:
+    """
+    Elementy okruszków z jednej linii markdown (None, gdy linia nimi nie jest)
+
+    Linia musi składać się wyłącznie z linków i krótkich tekstów rozdzielonych
+    separatorem (/, >, », ›, →) i zawierać co najmniej dwa linki. Linie z '|'
+    nie są okruszkami - tak zapisywane są menu i wiersze tabel.
+
+    Returns:
+        Pary (tekst, adres linku lub None) razem ze stroną główną
+    """
+    links = []
+
+    def placeholder(match):
+        links.append((match.group(1), match.group(2)))
+        return f"\x00{len(links) - 1}\x00"
+
+    masked = _LINK.sub(placeholder, _LIST_MARKER.sub('', line)).strip()
+    if len(links) < 2:
+        return None
+
+    crumbs = []
+    for part in _CRUMB_SEPARATOR.split(masked):
+        if not part:
+            continue
+        if part.startswith('\x00') and part.endswith('\x00') and part[1:-1].isdigit():
+            text, url = links[int(part[1:-1])]
+            crumbs.append((_text(text), url))
+        elif '\x00' in part or '|' in part or len(part) > _MAX_NAME_LENGTH:
+            return None
+        else:
+            crumbs.append((_text(part), None))
+    return crumbs
+
+
+def _list_item(body: str) -> Optional[Tuple[str, Optional[str]]]:
+    """Element listy numerowanej jako element okruszków (pojedynczy link lub krótki tekst)"""
+    link = _SINGLE_LINK.match(body)
+    if link:
+        return _text(link.group(1)), link.group(2)
+    if '](' not in body and '|' not in body and len(body) <= _MAX_NAME_LENGTH:
+        return _text(body), None
+    return None
+
+
+def _numbered_crumbs(lines: List[str]) -> List[Tuple[int, List[Tuple[str, Optional[str]]]]]:
+    """
+    Okruszki zapisane jako lista numerowana (Jina zamienia <ol> okruszków na '1. [Home](/)')
+
+    Returns:
+        Pary (numer pierwszej linii, elementy) dla list zaczynających się od 1.,
+        których elementy to pojedyncze linki lub krótkie teksty
+    """
+    candidates = []
+    start, run = 0, []
+    for index, line in enumerate(lines + ['']):
+        match = _NUMBERED_ITEM.match(line)
+        item = _list_item(match.group(2)) if match else None
+        if item is not None and int(match.group(1)) == len(run) + 1:
+            run.append(item)
+            continue
+        if len(run) >= 2:
+            candidates.append((start, run))
+        # Element przerywający listę może zaczynać nową
+        start, run = index, [item] if item is not None and int(match.group(1)) == 1 else []
+    return candidates
+
+
+def _path(url: str) -> str:
+    """Ścieżka adresu bez końcowego ukośnika"""
+    return urlsplit(url).path.rstrip('/')
+
+
+def _without_home(crumbs: List[Tuple[str, Optional[str]]]) -> Optional[List[Tuple[str, Optional[str]]]]:
+    """Elementy po stronie głównej (None, gdy kandydat nie zaczyna się od strony głównej)"""
+    if len(crumbs) < 2:
+        return None
+    home_text, home_url = crumbs[0]
+    if home_text.casefold() in _HOME_WORDS or (home_url is not None and _path(home_url) == ''):
+        return crumbs[1:]
+    return None
+
+
+def _is_nested(crumbs: List[Tuple[str, Optional[str]]]) -> bool:
+    """
+    Czy ścieżki linków kategorii się zagnieżdżają (każda jest prefiksem następnej)
+
+    Tak wyglądają okruszki (/narzedzia -> /narzedzia/wiertarki); menu ma
+    linki do stron rodzeństwa (/kontakt, /regulamin) i nie przechodzi.
+    """
+    previous = ''
+    for _, link in crumbs:
+        if link is None:
+            continue
+        path = _path(link)
+        if not path or path == previous or not path.startswith(previous):
+            return False
+        previous = path
+    return True
+
+
+def _is_current_page(crumb: Tuple[str, Optional[str]], url: str, title: str) -> bool:
+    """Czy element okruszków to sam produkt (bez linku, link do tej strony lub nazwa z tytułu)"""
+    text, link = crumb
+    if link is None:
+        return True
+    if url and _path(link) == _path(url):
+        return True
+    return bool(title) and _TITLE_SEPARATOR.split(title, 1)[0].strip() == text.casefold()
+
+
+def extract_breadcrumbs(content: str, url: str = "") -> List[str]:
+    """
+    Ścieżka kategorii z okruszków strony (bez strony głównej i samego produktu)
+
+    Kandydatami są linie linków rozdzielonych separatorem oraz listy
+    numerowane zaczynające się od strony głównej, z zagnieżdżonymi
+    ścieżkami linków. Wygrywa najgłębsza ścieżka, a przy równej długości
+    ostatnia na stronie (menu jest zwykle nad okruszkami).
+
+    Args:
+        content: Treść strony (markdown)
+        url: Adres strony produktu
+
+    Returns:
+        Nazwy kategorii od najogólniejszej (pusta lista, gdy brak okruszków)
+    """
+    if '](' not in content:
+        return []
+    title = page_title(content).casefold()
+    lines = content.split('\n')
+
+    candidates = [(index, _parse_crumbs(line)) for index, line in enumerate(lines) if line.count('](') >= 2]
+    candidates.extend(_numbered_crumbs(lines))
+    candidates.sort(key=lambda candidate: candidate[0])
+
+    best: List[str] = []
+    for _, crumbs in candidates:
+        crumbs = _without_home(crumbs) if crumbs else None
+        if not crumbs:
+            continue
+        if _is_current_page(crumbs[-1], url, title):
+            crumbs = crumbs[:-1]
+        if not _is_nested(crumbs):
+            continue
+        names = [text for text, _ in crumbs if text]
+        if names and len(names) >= len(best):
+            best = names
+    return best
+
+
+def _collect_parameters(content: str) -> Tuple[List[Dict[str, str]], int]:
+    """
+    Parametry z tabel specyfikacji i linii '**Nazwa:** wartość'
+
+    Tabela specyfikacji to blok kolejnych wierszy '|' z linią nagłówka
+    (|---|---|); pojedyncze wiersze bez niej (np. pasek menu) są pomijane.
+
+    Returns:
+        Krotka (lista parametrów, liczba parametrów z tabel specyfikacji)
+    """
+    parameters: Dict[str, Dict[str, str]] = {}
+
+    def add(name: str, value: str) -> bool:
+        name, value = _text(name).rstrip(':').strip(), _text(value)
+        key = name.casefold()
+        if (name and value and key not in parameters and key not in _HEADER_WORDS
+                and len(name) <= _MAX_NAME_LENGTH and len(parameters) < _MAX_PARAMETERS):
+            parameters[key] = {"parameter_name": name, "parameter_value": value}
+            return True
+        return False
+
+    from_tables = 0
+    if '|' in content:
+        block: List[str] = []
+        for line in content.split('\n') + ['']:
+            line = line.strip()
+            if line.startswith('|'):
+                block.append(line)
+                continue
+            if any(_TABLE_RULE.match(row) for row in block):
+                for row in block:
+                    if _TABLE_RULE.match(row):
+                        continue
+                    cells = [cell.strip() for cell in row.strip('|').split('|')]
+                    if len(cells) == 2 and add(*cells):
+                        from_tables += 1
+            block = []
+
+    if '**' in content:
+        for match in _BOLD_LABEL.finditer(content):
+            add(match.group(1), match.group(2))
+
+    return list(parameters.values()), from_tables
+
+
+def extract_structured(content: str, url: str = "", min_parameters: int = MIN_TABLE_PARAMETERS) -> Optional[Dict]:
+    """
+    Ekstrakcja w formacie kroku 3 bez zapytania do LLM
+
+    Args:
+        content: Treść strony (markdown z Jina Reader)
+        url: Adres strony produktu (rozpoznanie produktu w okruszkach)
+        min_parameters: Minimalna liczba parametrów z tabeli specyfikacji,
+            żeby uznać dane za wystarczające
+
+    Returns:
+        {"product_category", "product_parameters"} albo None, gdy strona nie ma
+        okruszków lub tabeli specyfikacji (wtedy produkt idzie do modelu)
+    """
+    if not content:
+        return None
+    crumbs = extract_breadcrumbs(content, url)
+    if not crumbs:
+        return None
+    parameters, from_tables = _collect_parameters(content)
+    if from_tables < min_parameters:
+        return None
+    return {
+        "product_category": {"main_category": crumbs[0], "subcategories": crumbs[1:]},
+        "product_parameters": parameters
+    }
@@ -0,0 +1,59 @@
+"""
+Token Estimator - przybliżone liczenie tokenów i pakowanie danych w budżet
+"""
+import math
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Polskie treści i JSON z ensure_ascii=False (diakrytyki, cudzysłowy, nawiasy)
+# dają w typowych tokenizerach ok. 2.5-3.5 znaku na token - dolna granica,
+# żeby szacunek był zawyżony i paczki nie przekraczały kontekstu modelu
+CHARS_PER_TOKEN = 2.5
+
+
+def estimate_tokens(text: str) -> int:
+    """Przybliżona liczba tokenów tekstu"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def pack_by_budget(
+    items: Iterable[T],
+    cost: Callable[[T], int],
+    budget: int,
+    max_items: int = 0,
+    output_cost: Optional[Callable[[T], int]] = None,
+    output_budget: int = 0
+) -> Iterator[List[T]]:
+    """
+    Grupuj elementy w paczki nieprzekraczające budżetu tokenów
+
+    Element większy niż budżet trafia do osobnej paczki. Kolejność elementów
+    jest zachowana, a paczki powstają leniwie (strumieniowo).
+
+    Args:
+        items: Elementy do pogrupowania
+        cost: Funkcja zwracająca koszt (tokeny) elementu
+        budget: Maksymalny łączny koszt paczki
+        max_items: Maksymalna liczba elementów w paczce (0 = bez limitu)
+        output_cost: Funkcja zwracająca szacowaną liczbę tokenów odpowiedzi dla elementu
+        output_budget: Maksymalna łączna odpowiedź paczki (0 = bez limitu), np.
+            część max_tokens zapytania
+    """
+    batch: List[T] = []
+    used = 0
+    output_used = 0
+    for item in items:
+        item_cost = cost(item)
+        item_output = output_cost(item) if output_cost and output_budget else 0
+        if batch and (used + item_cost > budget or (max_items and len(batch) >= max_items)
+                      or (output_budget and output_used + item_output > output_budget)):
+            yield batch
+            batch, used, output_used = [], 0, 0
+        batch.append(item)
+        used += item_cost
+        output_used += item_output
+    if batch:
+        yield batch
@@ -0,0 +1,158 @@
+"""
+URL Filter - skompilowany filtr URL-i produktów i deduplikacja
+"""
+import hashlib
+import re
+from typing import List, Optional, Pattern
+
+
+# Flagi globalne na początku reguły, np. (?i) - po połączeniu reguł byłyby w środku wyrażenia
+_GLOBAL_FLAGS = re.compile(r'^\(\?([aiLmsux]+)\)')
+
+# Odwołania do grup po numerze - połączenie reguł przesuwa numerację grup
+_NUMBERED_GROUP_REF = re.compile(r'\\[1-9]|\(\?\(\d')
+
+
+def url_key(url: str) -> int:
+    """Kompaktowy 64-bitowy klucz URL (oszczędność pamięci przy milionach URL-i)"""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class UrlFilter:
+    """
+    Filtr URL-i z regułami include/exclude skompilowanymi do jednego wyrażenia
+
+    Składnia (reguły oddzielone spacjami):
+        .html          - URL zawiera tekst
+        re:/p/\\d+      - URL pasuje do wyrażenia regularnego
+        path:/sklep/   - ścieżka URL zaczyna się od prefiksu
+        !<reguła>      - wyklucz URL-e pasujące do reguły (np. !/blog/, !re:\\?page=)
+
+    URL przechodzi filtr, gdy pasuje do dowolnej reguły include (lub brak reguł
+    include) i nie pasuje do żadnej reguły exclude. Wszystkie reguły danego typu
+    są łączone w jedno wyrażenie regularne kompilowane raz na cały przebieg;
+    flagi globalne reguł (np. re:(?i)/produkt/) są zamieniane na lokalne. Gdy
+    reguły nie dają się połączyć (odwołania do grup po numerze, powtórzone
+    nazwy grup), każda reguła jest sprawdzana osobno.
+    """
+
+    # Schemat + host - prefiks dla reguł ścieżki
+    _HOST_PREFIX = r'^[A-Za-z][A-Za-z0-9+.-]*://[^/?#]*'
+
+    def __init__(self, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None):
+        """
+        Args:
+            include: Reguły dopuszczające (w składni opisanej wyżej, bez '!')
+            exclude: Reguły wykluczające (w składni opisanej wyżej, bez '!')
+        """
+        self.include_rules = list(include or [])
+        self.exclude_rules = list(exclude or [])
+        self._include = self._compile(self.include_rules)
+        self._exclude = self._compile(self.exclude_rules)
+
+        # Szybka ścieżka dla klasycznego pojedynczego filtra podciągu (np. ".html")
+        self._substring = None
+        if (len(self.include_rules) == 1 and not self.exclude_rules
+                and not self.include_rules[0].startswith(('re:', 'path:'))):
+            self._substring = self.include_rules[0]
+
+    @classmethod
+    def parse(cls, text: Optional[str]) -> Optional['UrlFilter']:
+        """Zbuduj filtr z tekstu reguł (None gdy brak reguł)"""
+        if not text or not text.strip():
+            return None
+
+        include, exclude = [], []
+        for rule in text.split():
+            if rule.startswith('!'):
+                if len(rule) > 1:
+                    exclude.append(rule[1:])
+            else:
+                include.append(rule)
+
+        if not include and not exclude:
+            return None
+        return cls(include, exclude)
+
+    def _compile(self, rules: List[str]) -> List[Pattern]:
+        """Połącz reguły w jedno skompilowane wyrażenie (albo osobne, gdy nie da się ich połączyć)"""
+        if not rules:
+            return []
+
+        parts = []
+        separate = []
+        combinable = True
+        for rule in rules:
+            if rule.startswith('re:'):
+                pattern = rule[3:]
+                try:
+                    separate.append(re.compile(pattern))
+                except re.error as e:
+                    raise ValueError(f"Nieprawidłowe wyrażenie w filtrze URL '{rule}': {e}")
+                if _NUMBERED_GROUP_REF.search(pattern):
+                    combinable = False
+                flags = _GLOBAL_FLAGS.match(pattern)
+                if flags:
+                    pattern = f"(?{flags.group(1)}:{pattern[flags.end():]})"
+                parts.append(f"(?:{pattern})")
+            elif rule.startswith('path:'):
+                prefix = rule[5:]
+                if not prefix.startswith('/'):
+                    prefix = '/' + prefix
+                parts.append(self._HOST_PREFIX + re.escape(prefix))
+                separate.append(re.compile(parts[-1]))
+            else:
+                parts.append(re.escape(rule))
+                separate.append(re.compile(parts[-1]))
+
+        if combinable:
+            try:
+                return [re.compile('|'.join(parts))]
+            except re.error:
+                pass
+        return separate
+
+    @staticmethod
+    def _search(patterns: List[Pattern], url: str) -> bool:
+        """Czy URL pasuje do któregokolwiek wyrażenia"""
+        for pattern in patterns:
+            if pattern.search(url) is not None:
+                return True
+        return False
+
+    def matches(self, url: str) -> bool:
+        """Sprawdź czy URL przechodzi filtr"""
+        if self._substring is not None:
+            return self._substring in url
+        if self._include and not self._search(self._include, url):
+            return False
+        if self._exclude and self._search(self._exclude, url):
+            return False
+        return True
+
+    __call__ = matches
+
+
+class UrlDeduplicator:
+    """
+    Deduplikacja URL-i w locie
+
+    Przechowuje 64-bitowe klucze zamiast pełnych adresów - kilkukrotnie mniej
+    pamięci przy milionach URL-i (prawdopodobieństwo kolizji pomijalne).
+    """
+
+    def __init__(self):
+        self._seen = set()
+        self.duplicates = 0
+
+    def add(self, url: str) -> bool:
+        """Zarejestruj URL; zwraca False jeśli był już widziany"""
+        key = url_key(url)
+        if key in self._seen:
+            self.duplicates += 1
+            return False
+        self._seen.add(key)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._seen)